@@ -6,7 +6,9 @@ BOTPID=`ps -ef | grep '/usr/bin/python[3] -u ./core.py' | awk '{ print $2 }'`
 
 start() {
     if [ -z "$BOTPID" ]; then
-        /usr/bin/nohup ./core.py > status.log 2>&1 &
+        # Status messages and tick records are written (and rotated) by the bot in the logs folder; only unexpected output ends up here
+        mkdir -p logs
+        /usr/bin/nohup ./core.py > logs/console.log 2>&1 &
         sleep 3
         BOTPID=`ps -ef | grep '/usr/bin/python[3] -u ./core.py' | awk '{ print $2 }'`
         if [ -z "$BOTPID" ]; then
@@ -9,6 +9,18 @@ class asset:
     status = 'PB'
     profit = 0.0
 
+    # Limit order currently open for this asset (a sell order has its own ID), and how many times it was repriced
+    limit_price = 0.0
+    sell_order_id = ''
+    submitted_at = None
+    reprices = 0
+
+    # Set while we wait for Robinhood to process a cancel request ('cancel' or 'reprice'), so that it survives a restart
+    cancel_reason = ''
+
+    # When the sale was confirmed (the realized profit is counted on that day)
+    sold_at = None
+
     def __init__( self, ticker = '', quantity = 0.0, price = 0.0, order_id = '', status = 'PB', profit = 0.0, timestamp = 0 ):
         self.ticker = ticker
         self.quantity = float( quantity )
@@ -0,0 +1,262 @@
+from datetime import datetime
+from math import isnan
+import sqlite3
+
+# Indexed copy of the order log, kept next to the pickle files. The bot pushes
+# the orders that changed since the previous iteration, and triggers keep the
+# aggregates (realized profit per ticker and per day of sale, counts by status)
+# up to date, so that reports never need to scan or unpickle the whole order history.
+# Closed orders can be archived: they stay here, but are no longer kept in memory
+# (or in orders.pickle) by the bot
+
+class ledger:
+    schema = '''
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id TEXT PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            status TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            price REAL NOT NULL,
+            profit REAL NOT NULL,
+            seq INTEGER NOT NULL,
+            sold_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS orders_status ON orders ( status, timestamp );
+        CREATE INDEX IF NOT EXISTS orders_ticker ON orders ( ticker, timestamp );
+        CREATE INDEX IF NOT EXISTS orders_timestamp ON orders ( timestamp );
+        CREATE UNIQUE INDEX IF NOT EXISTS orders_seq ON orders ( seq );
+
+        CREATE TABLE IF NOT EXISTS profits (
+            ticker TEXT NOT NULL,
+            day TEXT NOT NULL,
+            profit REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY ( ticker, day )
+        );
+        CREATE TABLE IF NOT EXISTS status_counts (
+            status TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS prices (
+            ticker TEXT PRIMARY KEY,
+            price REAL NOT NULL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS archived (
+            order_id TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+
+        -- Only sold orders count towards the profit (the one of a pending sell is just an estimate), on the day they were sold
+        CREATE TRIGGER IF NOT EXISTS orders_insert AFTER INSERT ON orders BEGIN
+            INSERT INTO profits ( ticker, day, profit ) SELECT NEW.ticker, substr( NEW.sold_at, 1, 10 ), NEW.profit WHERE NEW.status = 'S'
+                ON CONFLICT ( ticker, day ) DO UPDATE SET profit = profit + NEW.profit;
+            INSERT INTO status_counts ( status, count ) VALUES ( NEW.status, 1 )
+                ON CONFLICT ( status ) DO UPDATE SET count = count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS orders_delete AFTER DELETE ON orders BEGIN
+            UPDATE profits SET profit = profit - OLD.profit WHERE OLD.status = 'S' AND ticker = OLD.ticker AND day = substr( OLD.sold_at, 1, 10 );
+            UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS orders_update AFTER UPDATE ON orders BEGIN
+            UPDATE profits SET profit = profit - OLD.profit WHERE OLD.status = 'S' AND ticker = OLD.ticker AND day = substr( OLD.sold_at, 1, 10 );
+            INSERT INTO profits ( ticker, day, profit ) SELECT NEW.ticker, substr( NEW.sold_at, 1, 10 ), NEW.profit WHERE NEW.status = 'S'
+                ON CONFLICT ( ticker, day ) DO UPDATE SET profit = profit + NEW.profit;
+            UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+            INSERT INTO status_counts ( status, count ) VALUES ( NEW.status, 1 )
+                ON CONFLICT ( status ) DO UPDATE SET count = count + 1;
+        END;
+    '''
+
+    columns = [ 'order_id', 'timestamp', 'ticker', 'status', 'quantity', 'price', 'profit', 'seq' ]
+
+    def __init__( self, filename = 'pickle/ledger.sqlite' ):
+        self.db = sqlite3.connect( filename )
+        self.db.executescript( self.schema )
+
+        # Fingerprint of each order as it was last written, used to only push the ones that changed (archived orders are not tracked)
+        self.synced = {}
+        for row in self.db.execute( 'SELECT order_id, status, quantity, price, profit FROM orders WHERE order_id NOT IN ( SELECT order_id FROM archived )' ):
+            self.synced[ row[ 0 ] ] = row[ 1: ]
+
+    def is_empty( self ):
+        return len( self.synced ) == 0 and self.db.execute( 'SELECT COUNT(*) FROM archived' ).fetchone()[ 0 ] == 0
+
+    def has_order( self, order_id ):
+        return self.db.execute( 'SELECT 1 FROM orders WHERE order_id = ?', ( str( order_id ), ) ).fetchone() is not None
+
+    def sync( self, orders ):
+        # Write only the orders that are new or changed since the last sync
+        changed = [ a_asset for a_asset in orders.values() if self.synced.get( str( a_asset.order_id ) ) != self.fingerprint( a_asset ) ]
+        removed = [ order_id for order_id in self.synced if order_id not in orders ]
+
+        if len( changed ) == 0 and len( removed ) == 0:
+            return 0
+
+        with self.db:
+            for a_asset in changed:
+                self.write( a_asset )
+
+            for order_id in removed:
+                self.delete( order_id )
+
+        return len( changed ) + len( removed )
+
+    def upsert( self, a_asset ):
+        with self.db:
+            self.write( a_asset )
+
+    def remove( self, order_id ):
+        with self.db:
+            self.delete( order_id )
+
+    def archive( self, orders ):
+        # Write the final state of these orders and stop tracking them: the caller can drop them from its order log
+        with self.db:
+            for a_asset in orders:
+                self.write( a_asset )
+                self.db.execute( 'INSERT OR IGNORE INTO archived ( order_id ) VALUES ( ? )', ( str( a_asset.order_id ), ) )
+                self.synced.pop( str( a_asset.order_id ), None )
+
+    def get_archived_profit( self ):
+        # Realized profit per ticker of the archived orders, to rebuild the portfolio without them
+        return { row[ 0 ]: row[ 1 ] for row in self.db.execute( "SELECT ticker, SUM( profit ) FROM orders WHERE status = 'S' AND order_id IN ( SELECT order_id FROM archived ) GROUP BY ticker" ) }
+
+    def update_prices( self, prices, timestamp ):
+        with self.db:
+            self.db.executemany(
+                'INSERT INTO prices ( ticker, price, timestamp ) VALUES ( ?, ?, ? ) ON CONFLICT ( ticker ) DO UPDATE SET price = excluded.price, timestamp = excluded.timestamp',
+                [ ( str( ticker ), float( price ), self.format_timestamp( timestamp ) ) for ticker, price in prices.items() if not isnan( float( price ) ) ]
+            )
+
+    def get_prices( self ):
+        return { row[ 0 ]: row[ 1 ] for row in self.db.execute( 'SELECT ticker, price FROM prices' ) }
+
+    def get_orders( self, status = None, start = None, end = None, after_seq = None ):
+        # Range and status queries are answered through the indexes, rows are streamed rather than loaded at once
+        query, params = self.build_filter( status, start, end )
+
+        if after_seq is not None:
+            query.append( 'seq > ?' )
+            params.append( int( after_seq ) )
+
+        sql = 'SELECT ' + ', '.join( self.columns ) + ' FROM orders'
+        if len( query ) > 0:
+            sql += ' WHERE ' + ' AND '.join( query )
+        sql += ' ORDER BY seq' if after_seq is not None else ' ORDER BY timestamp, seq'
+
+        for row in self.db.execute( sql, params ):
+            yield dict( zip( self.columns, row ) )
+
+    def get_profit( self, ticker = None, start = None, end = None ):
+        query, params = [], []
+
+        if ticker is not None:
+            query.append( 'ticker = ?' )
+            params.append( str( ticker ) )
+
+        if start is not None:
+            query.append( 'day >= ?' )
+            params.append( str( start )[ :10 ] )
+
+        if end is not None:
+            query.append( 'day <= ?' )
+            params.append( str( end )[ :10 ] )
+
+        sql = 'SELECT COALESCE( SUM( profit ), 0 ) FROM profits'
+        if len( query ) > 0:
+            sql += ' WHERE ' + ' AND '.join( query )
+
+        return round( self.db.execute( sql, params ).fetchone()[ 0 ], 3 )
+
+    def get_profit_by_ticker( self ):
+        return { row[ 0 ]: round( row[ 1 ], 3 ) for row in self.db.execute( 'SELECT ticker, SUM( profit ) FROM profits GROUP BY ticker ORDER BY ticker' ) }
+
+    def get_profit_by_day( self, start = None, end = None ):
+        query, params = [], []
+
+        if start is not None:
+            query.append( 'day >= ?' )
+            params.append( str( start )[ :10 ] )
+
+        if end is not None:
+            query.append( 'day <= ?' )
+            params.append( str( end )[ :10 ] )
+
+        sql = 'SELECT day, SUM( profit ) FROM profits'
+        if len( query ) > 0:
+            sql += ' WHERE ' + ' AND '.join( query )
+        sql += ' GROUP BY day ORDER BY day'
+
+        return { row[ 0 ]: round( row[ 1 ], 3 ) for row in self.db.execute( sql, params ) }
+
+    def get_status_counts( self ):
+        return { row[ 0 ]: row[ 1 ] for row in self.db.execute( 'SELECT status, count FROM status_counts WHERE count > 0 ORDER BY status' ) }
+
+    def get_meta( self, key, default = None ):
+        row = self.db.execute( 'SELECT value FROM meta WHERE key = ?', ( key, ) ).fetchone()
+        return default if row is None else row[ 0 ]
+
+    def set_meta( self, key, value ):
+        with self.db:
+            self.db.execute( 'INSERT INTO meta ( key, value ) VALUES ( ?, ? ) ON CONFLICT ( key ) DO UPDATE SET value = excluded.value', ( key, str( value ) ) )
+
+    def close( self ):
+        self.db.close()
+
+    def write( self, a_asset ):
+        # Every write gets a new sequence number, so that exports can pick up where they left off
+        seq = self.db.execute( 'SELECT COALESCE( MAX( seq ), 0 ) + 1 FROM orders' ).fetchone()[ 0 ]
+        order_id = str( a_asset.order_id )
+
+        self.db.execute(
+            'INSERT INTO orders ( order_id, timestamp, ticker, status, quantity, price, profit, seq, sold_at ) VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ? ) '
+            'ON CONFLICT ( order_id ) DO UPDATE SET timestamp = excluded.timestamp, ticker = excluded.ticker, status = excluded.status, '
+            'quantity = excluded.quantity, price = excluded.price, profit = excluded.profit, seq = excluded.seq, sold_at = excluded.sold_at',
+            ( order_id, self.format_timestamp( a_asset.timestamp ), str( a_asset.ticker ), str( a_asset.status ), float( a_asset.quantity ), float( a_asset.price ), float( a_asset.profit ), seq, self.get_sold_at( a_asset ) )
+        )
+
+        self.synced[ order_id ] = self.fingerprint( a_asset )
+
+    def delete( self, order_id ):
+        self.db.execute( 'DELETE FROM orders WHERE order_id = ?', ( str( order_id ), ) )
+        self.synced.pop( str( order_id ), None )
+
+    def build_filter( self, status, start, end ):
+        query, params = [], []
+
+        if status is not None:
+            query.append( 'status = ?' )
+            params.append( str( status ) )
+
+        if start is not None:
+            query.append( 'timestamp >= ?' )
+            params.append( str( start ) )
+
+        if end is not None:
+            # A bare date includes the whole day
+            query.append( 'timestamp <= ?' )
+            params.append( str( end ) + ( ' 23:59:59' if len( str( end ) ) == 10 else '' ) )
+
+        return query, params
+
+    def fingerprint( self, a_asset ):
+        return ( str( a_asset.status ), float( a_asset.quantity ), float( a_asset.price ), float( a_asset.profit ) )
+
+    def get_sold_at( self, a_asset ):
+        # Orders sold before the time of sale was recorded fall back to the time they were bought
+        if a_asset.status != 'S':
+            return None
+
+        return self.format_timestamp( a_asset.sold_at if a_asset.sold_at is not None else a_asset.timestamp )
+
+    def format_timestamp( self, timestamp ):
+        if isinstance( timestamp, datetime ):
+            return timestamp.strftime( '%Y-%m-%d %H:%M:%S' )
+
+        return str( timestamp )
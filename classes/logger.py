@@ -0,0 +1,104 @@
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+from os import path, makedirs
+import sys
+
+# Logging for the bot. Messages go through the standard 'bot' logger (modules
+# just call logging.getLogger( 'bot' )), filtered by the configured level; the
+# state at the end of each iteration is written as one compact JSON line to a
+# separate tick log. Both files are rotated when they reach the size limit.
+# The human-readable summary is rendered on demand by status.py
+
+class logger:
+    def __init__( self, folder = 'logs', level = 'INFO', max_bytes = 5242880, backup_count = 5, console = False ):
+        if not path.exists( folder ):
+            makedirs( folder )
+
+        self.log = logging.getLogger( 'bot' )
+        self.log.setLevel( getattr( logging, str( level ).upper(), logging.INFO ) )
+        self.log.propagate = False
+
+        status_handler = RotatingFileHandler( path.join( folder, 'status.log' ), maxBytes = max_bytes, backupCount = backup_count )
+        status_handler.setFormatter( logging.Formatter( '%(asctime)s %(levelname)-7s %(message)s', '%Y-%m-%d %H:%M:%S' ) )
+        self.log.addHandler( status_handler )
+
+        if console:
+            console_handler = logging.StreamHandler( sys.stdout )
+            console_handler.setFormatter( logging.Formatter( '%(message)s' ) )
+            self.log.addHandler( console_handler )
+
+        # Tick records: one JSON object per line, no formatting other than the message itself
+        self.ticks = logging.getLogger( 'bot.ticks' )
+        self.ticks.setLevel( logging.INFO )
+        self.ticks.propagate = False
+
+        tick_handler = RotatingFileHandler( path.join( folder, 'ticks.jsonl' ), maxBytes = max_bytes, backupCount = backup_count )
+        tick_handler.setFormatter( logging.Formatter( '%(message)s' ) )
+        self.ticks.addHandler( tick_handler )
+
+    def tick( self, record ):
+        self.ticks.info( json.dumps( record, separators = ( ',', ':' ), default = str ) )
+
+    @staticmethod
+    def render( record ):
+        # Human-readable summary of a tick record, as a list of lines
+        lines = []
+        row_format = "{:<16}  {:<6}  {:<6}  {:<12}  {:<12}  {:<12}  {:<12}"
+
+        lines.append( '-- Assets -------------------------------' )
+        if len( record[ 'assets' ] ) > 0:
+            lines.append( row_format.format( 'Date/Time', 'Status', 'Ticker', 'Quantity', 'Price', 'Cost', 'Value' ) )
+            for order_id, status, ticker, quantity, price, timestamp in record[ 'assets' ]:
+                value = record[ 'data' ].get( ticker )
+                lines.append( row_format.format( timestamp, status, ticker, str( quantity ), str( price ), str( round( price * quantity, 3 ) ), 'N/A' if value is None else str( round( value * quantity, 3 ) ) ) )
+        else:
+            lines.append( 'No assets found.' )
+
+        lines.append( '-- Portfolio ----------------------------' )
+        row_format = "{:<6}  {:<12}  {:<12}  {:<12}  {:<12}  {:<12}  {:<12}"
+        lines.append( row_format.format( 'Ticker', 'Quantity', 'Avg Cost', 'Exposure', 'Unrealized', 'Realized', 'Max DD' ) )
+        for a_row in record[ 'portfolio' ]:
+            lines.append( row_format.format( *[ str( x ) for x in a_row ] ) )
+
+        if 'paper' in record:
+            lines.append( '-- Paper Trading ------------------------' )
+            lines.append( 'Virtual cash: $' + str( record[ 'paper' ][ 'cash' ] ) )
+            row_format = "{:<16}  {:<6}  {:<6}  {:<12}  {:<12}  {:<12}"
+            if len( record[ 'paper' ][ 'assets' ] ) > 0:
+                lines.append( row_format.format( 'Date/Time', 'Status', 'Ticker', 'Quantity', 'Price', 'Cost' ) )
+                for order_id, status, ticker, quantity, price, timestamp in record[ 'paper' ][ 'assets' ]:
+                    lines.append( row_format.format( timestamp, status, ticker, str( quantity ), str( price ), str( round( price * quantity, 3 ) ) ) )
+
+            row_format = "{:<6}  {:<12}  {:<12}  {:<12}  {:<12}  {:<12}  {:<12}"
+            lines.append( row_format.format( 'Ticker', 'Quantity', 'Avg Cost', 'Exposure', 'Unrealized', 'Realized', 'Max DD' ) )
+            for a_row in record[ 'paper' ][ 'portfolio' ]:
+                lines.append( row_format.format( *[ str( x ) for x in a_row ] ) )
+
+        lines.append( '-- Bot Status ---------------------------' )
+        lines.append( 'Iteration completed on ' + str( record[ 'time' ] ) + ' (' + str( round( record[ 'duration' ] * 1000 ) ) + ' ms)' )
+        lines.append( 'Buying power: $' + str( record[ 'cash' ] ) )
+        lines.append( 'Daily P&L: $' + str( record[ 'daily_pnl' ] ) + ( ' (loss cap reached, buys suspended)' if record[ 'loss_cap' ] else '' ) )
+        for ticker, reason in record[ 'locked' ].items():
+            lines.append( 'Trading locked on ' + str( ticker ) + ' (' + str( reason ) + ')' )
+        lines.append( 'Data validation: ' + ', '.join( str( ticker ) + ' ' + ' '.join( name + '=' + str( value ) for name, value in counters.items() if value > 0 ) for ticker, counters in record[ 'validation' ].items() ) )
+
+        lines.append( '-- Data Snapshot ------------------------' )
+        if len( record[ 'data' ] ) > 0:
+            lines.append( 'Timestamp: ' + str( record[ 'data' ].get( 'timestamp' ) ) )
+
+            # One row per ticker, one column per indicator
+            suffixes = [ '', '_SMA_F', '_SMA_S', '_EMA_F', '_EMA_S', '_RSI', '_MACD', '_MACD_S' ]
+            row_format = "{:<6}" + "  {:<12}" * len( suffixes )
+            lines.append( row_format.format( 'Ticker', 'Price', *[ x[ 1: ] for x in suffixes[ 1: ] ] ) )
+            for ticker in record[ 'validation' ]:
+                values = [ record[ 'data' ].get( ticker + x ) for x in suffixes ]
+                lines.append( row_format.format( ticker, *[ 'N/A' if x is None else str( round( x, 3 ) ) for x in values ] ) )
+
+        return lines
+
+    def close( self ):
+        for a_logger in [ self.log, self.ticks ]:
+            for a_handler in list( a_logger.handlers ):
+                a_handler.close()
+                a_logger.removeHandler( a_handler )
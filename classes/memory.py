@@ -0,0 +1,76 @@
+import gc
+import logging
+from os import path, sysconf
+import resource
+import tracemalloc
+
+# Keeps an eye on the memory used by the bot when it runs for weeks. The
+# resident set size is compared against an optional budget, so that the bot can
+# spill data to disk before reaching it; when tracing is enabled, a tracemalloc
+# snapshot is taken every few iterations and the lines of code whose allocations
+# grew the most since the previous report are written to the status log
+
+class memory:
+    def __init__( self, budget_mb = 0, threshold = 0.9, trace = False, report_every = 288, top = 10, frames = 1 ):
+        self.budget_mb = float( budget_mb )
+        self.threshold = float( threshold )
+        self.trace = trace
+        self.report_every = int( report_every )
+        self.top = int( top )
+        self.log = logging.getLogger( 'bot' )
+
+        self.counter = 0
+        self.previous = None
+
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start( int( frames ) )
+
+    def get_usage( self ):
+        # Current resident set size in MB (peak size, where /proc is not available)
+        if path.exists( '/proc/self/statm' ):
+            with open( '/proc/self/statm', 'r' ) as f:
+                return int( f.read().split()[ 1 ] ) * sysconf( 'SC_PAGE_SIZE' ) / 1048576
+
+        return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024
+
+    def get_traced( self ):
+        # Memory currently allocated by Python objects, in MB (only when tracing)
+        if not tracemalloc.is_tracing():
+            return 0.0
+
+        return tracemalloc.get_traced_memory()[ 0 ] / 1048576
+
+    def is_near_limit( self ):
+        return self.budget_mb > 0 and self.get_usage() >= self.budget_mb * self.threshold
+
+    def tick( self ):
+        # Called once per iteration
+        self.counter += 1
+
+        if self.trace and self.report_every > 0 and self.counter % self.report_every == 0:
+            self.report()
+
+    def report( self ):
+        gc.collect()
+
+        snapshot = tracemalloc.take_snapshot().filter_traces( [
+            tracemalloc.Filter( False, tracemalloc.__file__ ),
+            tracemalloc.Filter( False, '<frozen importlib._bootstrap>' ),
+            tracemalloc.Filter( False, '<unknown>' )
+        ] )
+
+        lines = [ 'Memory: ' + str( round( self.get_usage(), 1 ) ) + ' MB resident, ' + str( round( self.get_traced(), 1 ) ) + ' MB traced' + ( ' (budget: ' + str( self.budget_mb ) + ' MB)' if self.budget_mb > 0 else '' ) ]
+
+        # Growth since the previous report; the first report lists the largest allocators
+        if self.previous is None:
+            stats = snapshot.statistics( 'lineno' )[ :self.top ]
+            lines.extend( '  ' + str( x.traceback[ 0 ] ) + ': ' + str( round( x.size / 1024, 1 ) ) + ' KB in ' + str( x.count ) + ' blocks' for x in stats )
+        else:
+            stats = snapshot.compare_to( self.previous, 'lineno' )[ :self.top ]
+            lines.extend( '  ' + str( x.traceback[ 0 ] ) + ': ' + str( round( x.size / 1024, 1 ) ) + ' KB (' + ( '+' if x.size_diff >= 0 else '' ) + str( round( x.size_diff / 1024, 1 ) ) + ' KB)' for x in stats )
+
+        # Only the most recent snapshot is kept
+        self.previous = snapshot
+        self.log.info( '\n'.join( lines ) )
+
+        return lines
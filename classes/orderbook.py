@@ -0,0 +1,76 @@
+import numpy as np
+
+# Local copy of the Kraken order book for each ticker, used to estimate the price
+# at which an order of a given size would be filled, instead of relying on the
+# top of the book alone. A full snapshot (many levels) is downloaded every few
+# minutes; in between, only the top levels are refreshed and merged with the
+# deeper ones already cached
+
+class orderbook:
+    def __init__( self, max_age_seconds = 15, full_refresh_seconds = 300 ):
+        self.max_age_seconds = float( max_age_seconds )
+        self.full_refresh_seconds = float( full_refresh_seconds )
+
+        # ticker -> { 'asks': ( prices, volumes ), 'bids': ( prices, volumes ), 'updated': time, 'full_update': time }
+        self.books = {}
+
+    def is_stale( self, ticker, now ):
+        return ticker not in self.books or ( now - self.books[ ticker ][ 'updated' ] ).total_seconds() > self.max_age_seconds
+
+    def needs_full_refresh( self, ticker, now ):
+        return ticker not in self.books or ( now - self.books[ ticker ][ 'full_update' ] ).total_seconds() > self.full_refresh_seconds
+
+    def update( self, ticker, asks, bids, now, full = True ):
+        # asks and bids: [ [ price, volume, timestamp ], ... ], best price first (as returned by the Depth API)
+        book = self.books.get( ticker ) if not full else None
+
+        new_book = { 'updated': now, 'full_update': now if book is None else book[ 'full_update' ] }
+        for side, levels in [ ( 'asks', asks ), ( 'bids', bids ) ]:
+            prices = np.array( [ float( x[ 0 ] ) for x in levels ], dtype = float )
+            volumes = np.array( [ float( x[ 1 ] ) for x in levels ], dtype = float )
+
+            # Partial update: the new levels replace the cached ones up to the last price received, the deeper ones are kept
+            if book is not None and prices.shape[ 0 ] > 0:
+                cached_prices, cached_volumes = book[ side ]
+                deeper = cached_prices > prices[ -1 ] if side == 'asks' else cached_prices < prices[ -1 ]
+                prices = np.concatenate( ( prices, cached_prices[ deeper ] ) )
+                volumes = np.concatenate( ( volumes, cached_volumes[ deeper ] ) )
+
+            new_book[ side ] = ( prices, volumes )
+
+        self.books[ ticker ] = new_book
+
+    def get_fill( self, ticker, side, quantity = None, amount = None ):
+        # Walks the asks (buy) or the bids (sell) until the order is filled, either by quantity of coins or by amount of dollars
+        # Returns the best price, the average fill price and the price of the last level needed, or None if the book is not deep enough
+        if ticker not in self.books:
+            return None
+
+        prices, volumes = self.books[ ticker ][ 'asks' if side == 'buy' else 'bids' ]
+        if prices.shape[ 0 ] == 0:
+            return None
+
+        if amount is not None:
+            cumulative = np.cumsum( prices * volumes )
+            target = float( amount )
+        else:
+            cumulative = np.cumsum( volumes )
+            target = float( quantity )
+
+        if target <= 0:
+            return None
+
+        # First level where the order is completely filled
+        last = int( np.searchsorted( cumulative, target ) )
+        if last >= prices.shape[ 0 ]:
+            return None
+
+        filled_before = cumulative[ last - 1 ] if last > 0 else 0.0
+        if amount is not None:
+            filled_quantity = volumes[ :last ].sum() + ( target - filled_before ) / prices[ last ]
+            cost = target
+        else:
+            filled_quantity = target
+            cost = ( prices[ :last ] * volumes[ :last ] ).sum() + ( target - filled_before ) * prices[ last ]
+
+        return { 'best': float( prices[ 0 ] ), 'average': float( cost / filled_quantity ), 'limit': float( prices[ last ] ), 'quantity': float( filled_quantity ) }
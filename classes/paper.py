@@ -0,0 +1,194 @@
+from classes.asset import asset
+from classes.portfolio import portfolio
+
+import logging
+from math import floor, isnan
+from os import path
+import pickle
+
+# Paper trading: a virtual wallet that follows the same signals as the live bot,
+# using the prices it already retrieved at each iteration (no additional API
+# calls). Orders are limit orders priced at the current mark plus/minus the
+# configured slippage; they can only be filled after the configured delay, and
+# only if the market price reaches the limit price by then. The cash balance and
+# the assets are saved to disk, so that the simulation can run for weeks; closed
+# orders beyond a given number are moved to a separate archive file
+
+class paper:
+    def __init__( self, tickers, filename = 'pickle/paper.pickle', initial_cash = 1000.0, slippage = 0.001, fill_delay_seconds = 60, cancel_pending_after_minutes = 20, min_share_increments = {}, min_price_increments = {}, max_exposure_per_ticker = 0.0, daily_loss_cap = 0.0 ):
+        self.tickers = list( tickers )
+        self.filename = filename
+        self.slippage = float( slippage )
+        self.fill_delay_seconds = float( fill_delay_seconds )
+        self.cancel_pending_after_minutes = float( cancel_pending_after_minutes )
+        self.min_share_increments = min_share_increments
+        self.min_price_increments = min_price_increments
+        self.log = logging.getLogger( 'bot' )
+
+        self.cash = float( initial_cash )
+        self.orders = {}
+        self.submitted = {} # order_id -> ( time when the pending order was placed, limit price )
+        self.counter = 0
+        self.archived_profit = {} # ticker -> realized profit of the archived orders
+        portfolio_state = None # drawdowns and daily P&L, see portfolio.get_state()
+
+        if path.exists( self.filename ):
+            with open( self.filename, 'rb' ) as f:
+                state = pickle.load( f )
+
+            self.cash = state[ 'cash' ]
+            self.orders = state[ 'orders' ]
+            self.submitted = state[ 'submitted' ]
+            self.counter = state[ 'counter' ]
+            self.archived_profit = state.get( 'archived_profit', {} )
+            portfolio_state = state.get( 'portfolio' )
+
+        # Same risk limits as the live bot
+        self.portfolio = portfolio( self.tickers, max_exposure_per_ticker, daily_loss_cap )
+        self.portfolio.rebuild( self.orders, self.archived_profit, portfolio_state )
+
+    def save( self ):
+        with open( self.filename, 'wb' ) as f:
+            pickle.dump( { 'cash': self.cash, 'orders': self.orders, 'submitted': self.submitted, 'counter': self.counter, 'archived_profit': self.archived_profit, 'portfolio': self.portfolio.get_state() }, f )
+
+    def archive( self, max_closed_orders ):
+        # Move the oldest closed orders to the archive file (one pickled asset after the other), keeping at most max_closed_orders in memory
+        closed = [ a_asset for a_asset in self.orders.values() if a_asset.status in [ 'S', 'C' ] ]
+        if len( closed ) <= max_closed_orders:
+            return 0
+
+        closed.sort( key = lambda x: x.timestamp )
+        closed = closed[ :len( closed ) - max_closed_orders ]
+
+        with open( self.filename.replace( '.pickle', '' ) + '-archive.pickle', 'ab' ) as f:
+            for a_asset in closed:
+                pickle.dump( a_asset, f )
+
+        for a_asset in closed:
+            if a_asset.status == 'S':
+                self.archived_profit[ a_asset.ticker ] = self.archived_profit.get( a_asset.ticker, 0.0 ) + a_asset.profit
+            self.orders.pop( a_asset.order_id )
+
+        # The wallet must not reference orders that only exist in the archive
+        self.save()
+
+        return len( closed )
+
+    def run( self, now, data, registry, buy_signals, locked_tickers, buy_amount_per_trade, stop_loss_threshold, liquidate_on_loss_cap = False ):
+        if data.shape[ 0 ] == 0:
+            return
+
+        prices = self.get_prices( data )
+
+        # Fill or cancel pending orders
+        self.check( now, data )
+
+        # Same sell conditions as the live bot
+        for a_asset in list( self.orders.values() ):
+            if a_asset.status == 'B' and a_asset.ticker in prices and a_asset.ticker not in locked_tickers:
+                if registry.sell( a_asset, data ) or prices[ a_asset.ticker ] < a_asset.price - ( a_asset.price * stop_loss_threshold ) or ( liquidate_on_loss_cap and self.portfolio.is_loss_cap_breached() ):
+                    self.sell( a_asset, prices[ a_asset.ticker ], now )
+
+        for ticker, is_buy_signal in buy_signals.items():
+            if is_buy_signal and ticker in prices:
+                self.buy( ticker, prices[ ticker ], now, buy_amount_per_trade )
+
+    def check( self, now, data ):
+        # Fill or cancel pending orders at the latest prices; also called between iterations, on the same schedule as the live orders
+        if data.shape[ 0 ] == 0:
+            return False
+
+        prices = self.get_prices( data )
+        changed = False
+
+        for a_asset in self.orders.values():
+            if a_asset.status in [ 'PB', 'PS' ] and a_asset.ticker in prices:
+                status = a_asset.status
+                self.process_pending( a_asset, prices[ a_asset.ticker ], now )
+                changed = changed or a_asset.status != status
+
+        self.portfolio.update( [ prices.get( ticker, float( 'nan' ) ) for ticker in self.portfolio.tickers ], now )
+
+        return changed
+
+    def get_prices( self, data ):
+        latest = data.iloc[ -1 ]
+        return { ticker: float( latest[ ticker ] ) for ticker in self.tickers if ticker in latest.index and not isnan( float( latest[ ticker ] ) ) }
+
+    def process_pending( self, a_asset, price, now ):
+        submitted_at, limit_price = self.submitted.get( a_asset.order_id, ( a_asset.timestamp, a_asset.price ) )
+        elapsed = ( now - submitted_at ).total_seconds()
+
+        # Not reachable by the exchange yet
+        if elapsed < self.fill_delay_seconds:
+            return
+
+        if a_asset.status == 'PB' and price <= limit_price:
+            a_asset.status = 'B'
+            self.submitted.pop( a_asset.order_id, None )
+            self.log.info( 'Paper: bought ' + str( a_asset.quantity ) + ' ' + str( a_asset.ticker ) + ' at $' + str( a_asset.price ) )
+
+        elif a_asset.status == 'PS' and price >= limit_price:
+            a_asset.status = 'S'
+            a_asset.sold_at = now
+            a_asset.profit = round( ( a_asset.quantity * limit_price ) - ( a_asset.quantity * a_asset.price ), 3 )
+            self.cash += a_asset.quantity * limit_price
+            self.portfolio.close( a_asset )
+            self.submitted.pop( a_asset.order_id, None )
+            self.log.info( 'Paper: sold ' + str( a_asset.quantity ) + ' ' + str( a_asset.ticker ) + ' at $' + str( limit_price ) + ' (profit: $' + str( a_asset.profit ) + ')' )
+
+        elif elapsed > self.cancel_pending_after_minutes * 60:
+            if a_asset.status == 'PB':
+                # Give the reserved cash back
+                a_asset.status = 'C'
+                a_asset.profit = 0
+                self.cash += a_asset.quantity * a_asset.price
+                self.portfolio.remove( a_asset )
+            else:
+                # The asset is still ours, and can be sold again at the next signal
+                a_asset.status = 'B'
+                a_asset.profit = 0
+
+            self.submitted.pop( a_asset.order_id, None )
+            self.log.info( 'Paper: cancelled order #' + str( a_asset.order_id ) )
+
+    def buy( self, ticker, price, now, buy_amount_per_trade ):
+        if self.cash <= 0 or self.cash < buy_amount_per_trade[ 'min' ]:
+            return False
+
+        limit_price = self.round_price( ticker, price * ( 1 + self.slippage ) )
+        amount = self.portfolio.get_buy_allowance( ticker, self.cash if buy_amount_per_trade[ 'max' ] == 0 else min( self.cash, buy_amount_per_trade[ 'max' ] ) )
+        quantity = self.round_quantity( ticker, amount / limit_price )
+
+        if quantity <= 0:
+            return False
+
+        self.counter += 1
+        order_id = 'paper-' + str( self.counter )
+        self.orders[ order_id ] = asset( ticker, quantity, limit_price, order_id, 'PB' )
+        self.orders[ order_id ].timestamp = now
+        self.submitted[ order_id ] = ( now, limit_price )
+        self.cash -= quantity * limit_price
+        self.portfolio.open( self.orders[ order_id ] )
+
+        return True
+
+    def sell( self, a_asset, price, now ):
+        limit_price = self.round_price( a_asset.ticker, price * ( 1 - self.slippage ) )
+
+        a_asset.status = 'PS'
+        a_asset.profit = round( ( a_asset.quantity * limit_price ) - ( a_asset.quantity * a_asset.price ), 3 )
+        self.submitted[ a_asset.order_id ] = ( now, limit_price )
+
+        return True
+
+    def round_price( self, ticker, price ):
+        increment = self.min_price_increments.get( ticker, 0.0001 )
+        return round( floor( price / increment ) * increment, 7 )
+
+    def round_quantity( self, ticker, quantity ):
+        increment = self.min_share_increments.get( ticker, 0.0001 )
+        return round( floor( quantity / increment ) * increment, 7 )
+
+    def get_assets( self ):
+        return [ [ a_asset.order_id, a_asset.status, a_asset.ticker, a_asset.quantity, a_asset.price, a_asset.timestamp.strftime( '%Y-%m-%d %H:%M' ) ] for a_asset in self.orders.values() if a_asset.status in [ 'B', 'PB', 'PS' ] ]
@@ -0,0 +1,158 @@
+from datetime import date
+import numpy as np
+
+# Aggregate view of the assets managed by the bot: positions, average cost,
+# realized/unrealized P&L and max drawdown, per ticker and in total. Positions
+# are updated when orders change state, and valuations are refreshed once per
+# iteration with a single vectorized pass over the latest prices
+
+class portfolio:
+    # Statuses of assets whose coins are (or are about to be) in the account
+    open_statuses = [ 'PB', 'B', 'PS' ]
+
+    def __init__( self, tickers, max_exposure_per_ticker = 0.0, daily_loss_cap = 0.0 ):
+        self.tickers = list( tickers )
+        self.index = { ticker: i for i, ticker in enumerate( self.tickers ) }
+        self.max_exposure_per_ticker = float( max_exposure_per_ticker )
+        self.daily_loss_cap = float( daily_loss_cap )
+
+        size = len( self.tickers )
+        self.quantity = np.zeros( size )
+        self.cost = np.zeros( size )
+        self.realized = np.zeros( size )
+        self.price = np.full( size, np.nan )
+        self.unrealized = np.zeros( size )
+        self.peak = np.zeros( size )
+        self.max_drawdown = np.zeros( size )
+
+        self.total_peak = 0.0
+        self.total_max_drawdown = 0.0
+
+        # P&L at the beginning of the current day, to enforce the daily loss cap
+        self.day = None
+        self.day_start_pnl = 0.0
+
+    def rebuild( self, orders, archived_profit = {}, state = None ):
+        # Reconstruct the positions from the saved orders (only needed at startup), plus the profit of the orders no longer kept in memory
+        # state: what get_state() returned before the restart, so that drawdowns and the daily loss cap pick up where they left off
+        if state is not None:
+            self.set_state( state )
+
+        self.quantity[:] = 0
+        self.cost[:] = 0
+        self.realized[:] = 0
+
+        for ticker, profit in archived_profit.items():
+            if ticker in self.index:
+                self.realized[ self.index[ ticker ] ] += profit
+
+        for a_asset in orders.values():
+            if a_asset.ticker not in self.index:
+                continue
+
+            if a_asset.status in self.open_statuses:
+                self.open( a_asset )
+            elif a_asset.status == 'S':
+                self.realized[ self.index[ a_asset.ticker ] ] += a_asset.profit
+
+    def get_state( self ):
+        # Values that can't be reconstructed from the orders
+        return {
+            'day': self.day.isoformat() if self.day is not None else None,
+            'day_start_pnl': self.day_start_pnl,
+            'peak': { ticker: float( self.peak[ i ] ) for ticker, i in self.index.items() },
+            'max_drawdown': { ticker: float( self.max_drawdown[ i ] ) for ticker, i in self.index.items() },
+            'total_peak': self.total_peak,
+            'total_max_drawdown': self.total_max_drawdown
+        }
+
+    def set_state( self, state ):
+        self.day = date.fromisoformat( state[ 'day' ] ) if state.get( 'day' ) else None
+        self.day_start_pnl = float( state.get( 'day_start_pnl', 0.0 ) )
+        self.total_peak = float( state.get( 'total_peak', 0.0 ) )
+        self.total_max_drawdown = float( state.get( 'total_max_drawdown', 0.0 ) )
+
+        for ticker, i in self.index.items():
+            self.peak[ i ] = state.get( 'peak', {} ).get( ticker, 0.0 )
+            self.max_drawdown[ i ] = state.get( 'max_drawdown', {} ).get( ticker, 0.0 )
+
+    def open( self, a_asset ):
+        i = self.index.get( a_asset.ticker )
+        if i is not None:
+            self.quantity[ i ] += a_asset.quantity
+            self.cost[ i ] += a_asset.quantity * a_asset.price
+
+    def remove( self, a_asset ):
+        # The asset is no longer held (cancelled buy, or removed from the log)
+        i = self.index.get( a_asset.ticker )
+        if i is not None:
+            self.quantity[ i ] = max( 0.0, self.quantity[ i ] - a_asset.quantity )
+            self.cost[ i ] = max( 0.0, self.cost[ i ] - a_asset.quantity * a_asset.price )
+
+    def close( self, a_asset ):
+        # The asset was sold: move its profit from unrealized to realized
+        self.remove( a_asset )
+
+        i = self.index.get( a_asset.ticker )
+        if i is not None:
+            self.realized[ i ] += a_asset.profit
+
+    def update( self, prices, now ):
+        # prices: latest values, in the same order as self.tickers
+        prices = np.asarray( prices, dtype = float )
+        self.price = np.where( np.isnan( prices ), self.price, prices )
+
+        self.unrealized = np.where( self.quantity > 0, self.quantity * np.nan_to_num( self.price ) - self.cost, 0.0 )
+        pnl = self.realized + self.unrealized
+
+        self.peak = np.maximum( self.peak, pnl )
+        self.max_drawdown = np.maximum( self.max_drawdown, self.peak - pnl )
+
+        total_pnl = float( pnl.sum() )
+        self.total_peak = max( self.total_peak, total_pnl )
+        self.total_max_drawdown = max( self.total_max_drawdown, self.total_peak - total_pnl )
+
+        if self.day != now.date():
+            self.day = now.date()
+            self.day_start_pnl = total_pnl
+
+    def get_price( self, ticker ):
+        return self.price[ self.index[ ticker ] ]
+
+    def get_average_cost( self, ticker ):
+        i = self.index[ ticker ]
+        return self.cost[ i ] / self.quantity[ i ] if self.quantity[ i ] > 0 else 0.0
+
+    def get_exposure( self, ticker ):
+        i = self.index[ ticker ]
+        return self.quantity[ i ] * np.nan_to_num( self.price[ i ] )
+
+    def get_total_pnl( self ):
+        return float( ( self.realized + self.unrealized ).sum() )
+
+    def get_daily_pnl( self ):
+        return self.get_total_pnl() - self.day_start_pnl
+
+    def is_loss_cap_breached( self ):
+        return self.daily_loss_cap > 0 and self.get_daily_pnl() <= -self.daily_loss_cap
+
+    def get_buy_allowance( self, ticker, amount ):
+        # How much (in dollars) can be spent on this ticker without breaking the risk limits
+        if self.is_loss_cap_breached():
+            return 0.0
+
+        if self.max_exposure_per_ticker > 0:
+            amount = min( amount, max( 0.0, self.max_exposure_per_ticker - self.get_exposure( ticker ) ) )
+
+        return amount
+
+    def summary( self ):
+        # One row per ticker with a position or some P&L history, plus the totals
+        rows = []
+        for ticker, i in self.index.items():
+            if self.quantity[ i ] > 0 or self.realized[ i ] != 0:
+                rows.append( [ ticker, round( float( self.quantity[ i ] ), 7 ) ] + [ round( float( x ), 3 ) for x in [ self.get_average_cost( ticker ), self.get_exposure( ticker ), self.unrealized[ i ], self.realized[ i ], self.max_drawdown[ i ] ] ] )
+
+        rows.append( [ 'Total', '', '', round( float( ( self.quantity * np.nan_to_num( self.price ) ).sum() ), 3 ), round( float( self.unrealized.sum() ), 3 ), round( float( self.realized.sum() ), 3 ), round( self.total_max_drawdown, 3 ) ] )
+
+        return rows
@@ -0,0 +1,179 @@
+import gzip
+import pickle
+from time import sleep
+import zlib
+
+# Records every input the bot receives from the outside world (API responses,
+# account balance, open orders, current time) in a compressed file, and feeds
+# them back to the bot later, at full speed. Functions are wrapped with wrap():
+# when recording, each call is executed and its result saved; when replaying,
+# the result is taken from the file instead.
+#
+# The file is a gzip stream of pickled objects: a header (config and initial
+# state files), then one tuple per event:
+#   ( 'pass', name ): the bot started an iteration (run) or an order check between iterations (check_orders)
+#   ( 'call', name, args, kwargs, result, error ): an external call and its outcome
+# During a replay, each call is matched with the first unused call recorded
+# in the same pass with the same name and arguments; calls that can't be matched
+# (because the code changed) raise an exception, just like a failed API call
+
+class response:
+    # Stands in for a response of the requests library: only the decoded JSON is recorded
+    def __init__( self, data ):
+        self.data = data
+
+    def json( self ):
+        return self.data
+
+    @staticmethod
+    def from_requests( result ):
+        return response( result.json() )
+
+class module:
+    # Wraps the functions of a module (and of its submodules), e.g. rh.get_crypto_quote or rh.account.load_phoenix_account
+    def __init__( self, session, name, target, private = [] ):
+        self._session = session
+        self._name = name
+        self._target = target
+        self._private = private
+        self._wrapped = {}
+
+    def __getattr__( self, attribute ):
+        if attribute not in self._wrapped:
+            value = getattr( self._target, attribute )
+            name = self._name + '.' + attribute
+
+            if callable( value ):
+                self._wrapped[ attribute ] = self._session.wrap( name, value, private = attribute in self._private )
+            else:
+                self._wrapped[ attribute ] = module( self._session, name, value, self._private )
+
+        return self._wrapped[ attribute ]
+
+class recording:
+    format_version = 1
+
+    def __init__( self, filename, mode = 'r', header = {} ):
+        self.filename = filename
+        self.is_replaying = mode == 'r'
+        self.file = gzip.open( filename, 'rb' if self.is_replaying else 'wb' )
+
+        # Replay: events of the current pass, which of them were used, calls that couldn't be matched
+        self.events = []
+        self.used = []
+        self.next_pass = None
+        self.last_results = {}
+        self.not_recorded = {}
+        self.event_count = 0
+
+        if self.is_replaying:
+            self.header = self.read()
+            if not isinstance( self.header, dict ) or self.header.get( 'format_version' ) != self.format_version:
+                raise ValueError( 'Unsupported recording format in ' + filename )
+
+            # Events recorded before the first pass (while the bot was starting up)
+            self.load_pass()
+        else:
+            self.header = dict( header, format_version = self.format_version )
+            self.write( self.header )
+
+    def wrap( self, name, function, convert = None, private = False, repeat_last = False ):
+        # convert: applied to the result before recording it; private: arguments and result are not saved (credentials)
+        # repeat_last: when replaying, return the last value again if the pass doesn't have any more calls to this function
+        def wrapper( *args, **kwargs ):
+            if self.is_replaying:
+                return self.replay( name, args, kwargs, private, repeat_last )
+
+            try:
+                result = function( *args, **kwargs )
+                if convert is not None:
+                    result = convert( result )
+            except Exception as e:
+                self.write( ( 'call', name, None if private else args, None if private else kwargs, None, repr( e ) ) )
+                raise
+
+            self.write( ( 'call', name, None if private else args, None if private else kwargs, None if private else result, None ) )
+
+            return result
+
+        return wrapper
+
+    def wrap_module( self, name, target, private = [] ):
+        return module( self, name, target, private )
+
+    def wrap_pass( self, name, function ):
+        # Marks the beginning of each pass while recording
+        def wrapper( *args, **kwargs ):
+            if not self.is_replaying:
+                self.write( ( 'pass', name ) )
+                self.file.flush()
+
+            return function( *args, **kwargs )
+
+        return wrapper
+
+    def sleep( self, seconds ):
+        # No waiting when replaying
+        if not self.is_replaying:
+            sleep( seconds )
+
+    def passes( self ):
+        # Replay: yields the name of each recorded pass, after loading its events
+        while self.next_pass is not None:
+            name = self.next_pass
+            self.load_pass()
+
+            yield name
+
+    def load_pass( self ):
+        self.events = []
+        self.next_pass = None
+
+        while True:
+            event = self.read()
+
+            if event is None:
+                break
+
+            if event[ 0 ] == 'pass':
+                self.next_pass = event[ 1 ]
+                break
+
+            self.events.append( event )
+
+        self.used = [ False ] * len( self.events )
+        self.event_count += len( self.events )
+
+    def replay( self, name, args, kwargs, private, repeat_last ):
+        for i, event in enumerate( self.events ):
+            if not self.used[ i ] and event[ 1 ] == name and ( private or ( event[ 2 ] == args and event[ 3 ] == kwargs ) ):
+                self.used[ i ] = True
+                self.last_results[ name ] = event[ 4 ]
+
+                if event[ 5 ] is not None:
+                    raise Exception( 'Recorded error: ' + event[ 5 ] )
+
+                return event[ 4 ]
+
+        if repeat_last and name in self.last_results:
+            return self.last_results[ name ]
+
+        self.not_recorded[ name ] = self.not_recorded.get( name, 0 ) + 1
+        raise LookupError( name + str( args ) + ' was not recorded' )
+
+    def get_unused( self ):
+        # Calls recorded in the current pass that the bot didn't make when replaying it
+        return [ event for i, event in enumerate( self.events ) if not self.used[ i ] ]
+
+    def read( self ):
+        try:
+            return pickle.load( self.file )
+        except ( EOFError, gzip.BadGzipFile, pickle.UnpicklingError, zlib.error ):
+            # The end of the file, or the bot was stopped abruptly
+            return None
+
+    def write( self, event ):
+        pickle.dump( event, self.file, protocol = pickle.HIGHEST_PROTOCOL )
+
+    def close( self ):
+        self.file.close()
@@ -0,0 +1,173 @@
+import inspect
+import logging
+from math import isnan
+import re
+
+# Resolves the buy and sell signals selected in config[ 'trade_signals' ] once,
+# when the bot starts, and validates their parameters. Two kinds of signals are
+# supported:
+# - methods of classes/signals.py (buy_xxx/sell_xxx), called with the dataframe and,
+#   if they have an 'indicators' parameter, with the same raw arrays as expressions
+#   (a dict: indicators[ 'rsi' ][ -1 ]), instead of looking up columns by name
+# - expressions, evaluated over the raw indicator arrays of each ticker, e.g.:
+#   'buy': { 'expression': 'rsi[-1] < rsi_threshold and price[-1] < sma_f[-1]', 'params': { 'rsi_threshold': 30 } }
+#   Expressions are compiled into a plain function (with Numba, if 'jit' is True and
+#   it's installed), and the column of each indicator is looked up only once
+
+class registry:
+    # Array name available to expressions -> column suffix in the dataframe
+    indicators = {
+        'price': '',
+        'sma_f': '_SMA_F',
+        'sma_s': '_SMA_S',
+        'ema_f': '_EMA_F',
+        'ema_s': '_EMA_S',
+        'rsi': '_RSI',
+        'macd': '_MACD',
+        'macd_s': '_MACD_S'
+    }
+
+    # Additional values available to sell expressions
+    asset_fields = [ 'purchase_price', 'quantity' ]
+
+    functions_allowed = { 'abs': abs, 'min': min, 'max': max, 'isnan': isnan }
+
+    def __init__( self, signals, trade_signals, tickers ):
+        self.tickers = list( tickers )
+        self.signals = {}
+        self.with_indicators = {}
+        self.expressions = {}
+        self.params = {}
+
+        for side in [ 'buy', 'sell' ]:
+            if side not in trade_signals:
+                raise ValueError( 'No ' + side + ' signal defined in trade_signals' )
+
+            settings = trade_signals[ side ]
+            params = settings.get( 'params', {} )
+
+            if 'expression' in settings:
+                self.expressions[ side ] = self.compile_expression( side, settings[ 'expression' ], params, settings.get( 'jit', False ) )
+                self.params[ side ] = tuple( float( params[ x ] ) for x in sorted( params ) )
+            else:
+                self.signals[ side ] = self.resolve_method( signals, side, settings.get( 'function' ), params )
+                self.with_indicators[ side ] = 'indicators' in inspect.signature( self.signals[ side ] ).parameters
+
+        # Column positions, resolved when the dataset layout changes
+        self.columns = None
+        self.index = {}
+        self.positions = []
+        self.values = None
+        self.arrays = {}
+        self.named_arrays = {}
+
+    def resolve_method( self, signals, side, function, params ):
+        method = getattr( signals, side + '_' + str( function ), None )
+
+        if method is None:
+            available = [ x[ len( side ) + 1: ] for x in dir( signals ) if x.startswith( side + '_' ) ]
+            raise ValueError( 'Unknown ' + side + ' signal \'' + str( function ) + '\' (available: ' + ', '.join( available ) + ')' )
+
+        # Signal methods document their parameters in a '# Params: a, b' comment
+        try:
+            match = re.search( r'#\s*Params:\s*(.+)', inspect.getsource( method ) )
+        except ( OSError, TypeError ):
+            match = None
+
+        if match is not None:
+            missing = [ x.strip() for x in match.group( 1 ).split( ',' ) if x.strip() != '' and x.strip() not in params ]
+            if len( missing ) > 0:
+                raise ValueError( 'Missing params for ' + side + ' signal \'' + str( function ) + '\': ' + ', '.join( missing ) )
+
+        return method
+
+    def compile_expression( self, side, expression, params, jit ):
+        arguments = list( self.indicators ) + ( self.asset_fields if side == 'sell' else [] )
+        param_names = sorted( params )
+
+        try:
+            code = compile( expression, '<' + side + ' signal>', 'eval' )
+        except SyntaxError as e:
+            raise ValueError( 'Invalid ' + side + ' expression: ' + str( e ) )
+
+        unknown = [ x for x in code.co_names if x not in arguments and x not in param_names and x not in self.functions_allowed ]
+        if len( unknown ) > 0:
+            raise ValueError( 'Unknown names in ' + side + ' expression: ' + ', '.join( unknown ) + ' (available: ' + ', '.join( arguments + param_names ) + ')' )
+
+        for a_param in param_names:
+            try:
+                float( params[ a_param ] )
+            except ( TypeError, ValueError ):
+                raise ValueError( 'Param \'' + a_param + '\' of ' + side + ' expression must be a number' )
+
+        source = 'def signal( ' + ', '.join( arguments + param_names ) + ' ):\n    return ' + expression + '\n'
+        namespace = dict( self.functions_allowed )
+        exec( source, namespace )
+        function = namespace[ 'signal' ]
+
+        if jit:
+            try:
+                from numba import njit
+                function = njit( cache = False )( function )
+            except ImportError:
+                logging.getLogger( 'bot' ).warning( 'Numba not available, ' + side + ' expression will run as plain Python.' )
+
+        return function
+
+    def prepare( self, data ):
+        # Called once per iteration: map the indicator columns and grab the raw values
+        if ( len( self.expressions ) == 0 and not any( self.with_indicators.values() ) ) or data.shape[ 0 ] == 0:
+            return
+
+        if self.columns is None or not data.columns.equals( self.columns ):
+            self.columns = data.columns
+            self.index = {}
+            for ticker in self.tickers:
+                if all( ( ticker + x ) in data.columns for x in self.indicators.values() ):
+                    self.index[ ticker ] = [ data.columns.get_loc( ticker + x ) for x in self.indicators.values() ]
+
+            self.positions = sorted( set( x for a_index in self.index.values() for x in a_index ) )
+            lookup = { x: i for i, x in enumerate( self.positions ) }
+            self.index = { ticker: [ lookup[ x ] for x in a_index ] for ticker, a_index in self.index.items() }
+
+        # One copy of the indicator columns per iteration; each ticker gets views on it
+        self.values = data.iloc[ :, self.positions ].to_numpy( dtype = float )
+        self.arrays = { ticker: [ self.values[ :, x ] for x in a_index ] for ticker, a_index in self.index.items() }
+        self.named_arrays = { ticker: dict( zip( self.indicators, arrays ) ) for ticker, arrays in self.arrays.items() }
+
+    # When replaying historical data, 'end' evaluates the signal as if the dataset stopped at that row
+    def buy( self, ticker, data, end = None ):
+        if 'buy' in self.signals and not self.with_indicators[ 'buy' ]:
+            return self.signals[ 'buy' ]( ticker, data if end is None else data.iloc[ :end ] )
+
+        if ticker not in self.arrays:
+            return False
+
+        if 'buy' in self.signals:
+            return bool( self.signals[ 'buy' ]( ticker, data if end is None else data.iloc[ :end ], self.get_named_arrays( ticker, end ) ) )
+
+        return bool( self.expressions[ 'buy' ]( *self.get_arrays( ticker, end ), *self.params[ 'buy' ] ) )
+
+    def sell( self, asset, data, end = None ):
+        if 'sell' in self.signals and not self.with_indicators[ 'sell' ]:
+            return self.signals[ 'sell' ]( asset, data if end is None else data.iloc[ :end ] )
+
+        if asset.ticker not in self.arrays:
+            return False
+
+        if 'sell' in self.signals:
+            return bool( self.signals[ 'sell' ]( asset, data if end is None else data.iloc[ :end ], self.get_named_arrays( asset.ticker, end ) ) )
+
+        return bool( self.expressions[ 'sell' ]( *self.get_arrays( asset.ticker, end ), asset.price, asset.quantity, *self.params[ 'sell' ] ) )
+
+    def get_arrays( self, ticker, end ):
+        if end is None:
+            return self.arrays[ ticker ]
+
+        return [ x[ :end ] for x in self.arrays[ ticker ] ]
+
+    def get_named_arrays( self, ticker, end ):
+        if end is None:
+            return self.named_arrays[ ticker ]
+
+        return { name: x[ :end ] for name, x in self.named_arrays[ ticker ].items() }
@@ -0,0 +1,91 @@
+from classes.asset import asset
+
+import numpy as np
+import pandas as pd
+from talib import RSI, MACD
+
+# Replays a price series through the buy/sell signals resolved by the registry,
+# to measure how a strategy would have performed. Orders are filled at the
+# price of the current data point, plus/minus the slippage; sizing and stop
+# loss follow the 'assets' section of the config file
+
+class replay:
+    def __init__( self, ta, assets, slippage = 0.0 ):
+        self.ta = ta
+        self.assets = assets
+        self.slippage = float( slippage )
+
+    def add_indicators( self, data, ticker ):
+        # Same indicators the bot computes at each iteration
+        periods = self.ta[ 'moving_average_periods' ]
+
+        data[ ticker + '_SMA_F' ] = data[ ticker ].rolling( window = periods[ 'sma_fast' ] ).mean()
+        data[ ticker + '_SMA_S' ] = data[ ticker ].rolling( window = periods[ 'sma_slow' ] ).mean()
+        data[ ticker + '_EMA_F' ] = data[ ticker ].ewm( span = periods[ 'ema_fast' ], adjust = False, min_periods = periods[ 'ema_fast' ] ).mean()
+        data[ ticker + '_EMA_S' ] = data[ ticker ].ewm( span = periods[ 'ema_slow' ], adjust = False, min_periods = periods[ 'ema_slow' ] ).mean()
+        data[ ticker + '_RSI' ] = RSI( data[ ticker ].values, timeperiod = self.ta[ 'rsi_period' ] )
+        data[ ticker + '_MACD' ], data[ ticker + '_MACD_S' ], macd_hist = MACD( data[ ticker ].values, fastperiod = periods[ 'macd_fast' ], slowperiod = periods[ 'macd_slow' ], signalperiod = periods[ 'macd_signal' ] )
+
+        return data
+
+    def build( self, timestamps, prices, ticker ):
+        data = pd.DataFrame( { 'timestamp': pd.to_datetime( timestamps ), ticker: prices } )
+
+        return self.add_indicators( data, ticker )
+
+    def run( self, data, ticker, registry, start = 0, end = None, initial_cash = 1000.0 ):
+        # Returns the profit, max drawdown (as a fraction of the peak equity) and number of trades between start and end
+        end = data.shape[ 0 ] if end is None else min( end, data.shape[ 0 ] )
+        prices = data[ ticker ].to_numpy( dtype = float )
+        timestamps = data[ 'timestamp' ]
+        registry.prepare( data )
+
+        cash = float( initial_cash )
+        held = []
+        trades = 0
+        peak = cash
+        max_drawdown = 0.0
+        price = np.nan
+
+        for i in range( start, end ):
+            if np.isnan( prices[ i ] ):
+                continue
+
+            price = prices[ i ]
+
+            for a_asset in list( held ):
+                if registry.sell( a_asset, data, i + 1 ) or price < a_asset.price - ( a_asset.price * self.assets[ 'stop_loss_threshold' ] ):
+                    cash += a_asset.quantity * price * ( 1 - self.slippage )
+                    held.remove( a_asset )
+                    trades += 1
+
+            if cash > 0 and cash >= self.assets[ 'buy_amount_per_trade' ][ 'min' ] and registry.buy( ticker, data, i + 1 ):
+                amount = cash if self.assets[ 'buy_amount_per_trade' ][ 'max' ] == 0 else min( cash, self.assets[ 'buy_amount_per_trade' ][ 'max' ] )
+                fill_price = price * ( 1 + self.slippage )
+                a_asset = asset( ticker, amount / fill_price, fill_price, str( i ), 'B' )
+                a_asset.status = 'B'
+                a_asset.timestamp = timestamps.iat[ i ]
+                held.append( a_asset )
+                cash -= amount
+                trades += 1
+
+            equity = cash + sum( x.quantity for x in held ) * price
+            peak = max( peak, equity )
+            max_drawdown = max( max_drawdown, ( peak - equity ) / peak if peak > 0 else 0.0 )
+
+        # Open positions are valued at the last price
+        equity = cash + ( sum( x.quantity for x in held ) * price if len( held ) > 0 else 0.0 )
+
+        return { 'profit': round( equity - initial_cash, 3 ), 'max_drawdown': round( max_drawdown, 5 ), 'trades': trades }
+
+    @staticmethod
+    def bootstrap( prices, block_size, rng ):
+        # Block bootstrap of the log returns: keeps short-term autocorrelation, shuffles the regimes
+        returns = np.diff( np.log( prices ) )
+        count = returns.shape[ 0 ]
+        block_size = max( 1, min( int( block_size ), count ) )
+
+        starts = rng.integers( 0, count - block_size + 1, size = int( np.ceil( count / block_size ) ) )
+        sampled = np.concatenate( [ returns[ x:x + block_size ] for x in starts ] )[ :count ]
+
+        return prices[ 0 ] * np.exp( np.concatenate( ( [ 0.0 ], np.cumsum( sampled ) ) ) )
@@ -2,10 +2,13 @@ from config import config
 from math import isnan
 
 # Signal functions are defined in alphabetical order and return a boolean value
-# indicating if a given asset should be traded based on certain conditions
+# indicating if a given asset should be traded based on certain conditions. Functions
+# with an 'indicators' parameter receive the raw values of each indicator (price,
+# sma_f, sma_s, ema_f, ema_s, rsi, macd, macd_s), which are faster to read than the
+# columns of the dataframe
 
 class signals:
-    def buy_ema_crossover_rsi( self, ticker, data ):
+    def buy_ema_crossover_rsi( self, ticker, data, indicators ):
         # Exponential Moving Average Crossover with RSI Filter
         # Buy when Fast-EMA crosses Slow-EMA from below, and RSI > buy threshold (50 suggested)
         #
@@ -13,21 +16,21 @@ class signals:
 
         return(        
             # Make sure the data is valid
-            not isnan( data.iloc[ -1 ][ ticker + '_EMA_F' ] ) and
-            not isnan( data.iloc[ -2 ][ ticker + '_EMA_F' ] ) and
-            not isnan( data.iloc[ -1 ][ ticker + '_EMA_S' ] ) and
-            not isnan( data.iloc[ -2 ][ ticker + '_EMA_S' ] ) and
-            not isnan( data.iloc[ -1 ][ ticker + '_RSI' ] ) and
+            not isnan( indicators[ 'ema_f' ][ -1 ] ) and
+            not isnan( indicators[ 'ema_f' ][ -2 ] ) and
+            not isnan( indicators[ 'ema_s' ][ -1 ] ) and
+            not isnan( indicators[ 'ema_s' ][ -2 ] ) and
+            not isnan( indicators[ 'rsi' ][ -1 ] ) and
 
             # Fast-EMA crossed Slow-EMA from below
-            data.iloc[ -2 ][ ticker + '_EMA_F' ] < data.iloc[ -2 ][ ticker + '_EMA_S' ]  and
-            data.iloc[ -1 ][ ticker + '_EMA_F' ] >= data.iloc[ -1 ][ ticker + '_EMA_S' ]  and
+            indicators[ 'ema_f' ][ -2 ] < indicators[ 'ema_s' ][ -2 ]  and
+            indicators[ 'ema_f' ][ -1 ] >= indicators[ 'ema_s' ][ -1 ]  and
             
             # RSI above threshold
-            data.iloc[ -1 ][ ticker + '_RSI' ] > config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'rsi_threshold' ]
+            indicators[ 'rsi' ][ -1 ] > config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'rsi_threshold' ]
         )
 
-    def buy_sma_crossover_rsi( self, ticker, data ):
+    def buy_sma_crossover_rsi( self, ticker, data, indicators ):
         # Simple Moving Average Crossover with RSI Filter
         # Credits: https://trader.autochartist.com/moving-average-crossover-with-rsi-filter/
         # Buy when Fast-SMA crosses Slow-SMA from below, and RSI > buy threshold (50 suggested)
@@ -36,21 +39,21 @@ class signals:
 
         return(        
             # Make sure the data is valid
-            not isnan( data.iloc[ -1 ][ ticker + '_SMA_F' ] ) and
-            not isnan( data.iloc[ -2 ][ ticker + '_SMA_F' ] ) and
-            not isnan( data.iloc[ -1 ][ ticker + '_SMA_S' ] ) and
-            not isnan( data.iloc[ -2 ][ ticker + '_SMA_S' ] ) and
-            not isnan( data.iloc[ -1 ][ ticker + '_RSI' ] ) and
+            not isnan( indicators[ 'sma_f' ][ -1 ] ) and
+            not isnan( indicators[ 'sma_f' ][ -2 ] ) and
+            not isnan( indicators[ 'sma_s' ][ -1 ] ) and
+            not isnan( indicators[ 'sma_s' ][ -2 ] ) and
+            not isnan( indicators[ 'rsi' ][ -1 ] ) and
 
             # Fast-SMA crossed Slow-SMA from below
-            data.iloc[ -2 ][ ticker + '_SMA_F' ] < data.iloc[ -2 ][ ticker + '_SMA_S' ]  and
-            data.iloc[ -1 ][ ticker + '_SMA_F' ] >= data.iloc[ -1 ][ ticker + '_SMA_S' ]  and
+            indicators[ 'sma_f' ][ -2 ] < indicators[ 'sma_s' ][ -2 ]  and
+            indicators[ 'sma_f' ][ -1 ] >= indicators[ 'sma_s' ][ -1 ]  and
             
             # RSI above threshold
-            data.iloc[ -1 ][ ticker + '_RSI' ] > config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'rsi_threshold' ]
+            indicators[ 'rsi' ][ -1 ] > config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'rsi_threshold' ]
         )
 
-    def buy_sma_rsi_threshold( self, ticker, data ):
+    def buy_sma_rsi_threshold( self, ticker, data, indicators ):
         # Simple Moving Average and RSI
         # Credits: https://medium.com/swlh/a-full-crypto-trading-bot-in-python-aafba122bc4e
         # Buy when price is below Fast-SMA and RSI is below threshold
@@ -58,72 +61,72 @@ class signals:
         # Params: buy_below_moving_average, rsi_threshold
         
         return (
-            not isnan( data.iloc[ -1 ][ ticker + '_SMA_F' ] ) and
-            not isnan( data.iloc[ -1 ][ ticker + '_RSI' ] ) and
+            not isnan( indicators[ 'sma_f' ][ -1 ] ) and
+            not isnan( indicators[ 'rsi' ][ -1 ] ) and
 
             # Is the current price below the Fast-SMA by the percentage defined in the config file?
-            data.iloc[ -1 ][ ticker ] <= data.iloc[ -1 ][ ticker + '_SMA_F' ] - ( data.iloc[ -1 ][ ticker + '_SMA_F' ] * config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'buy_below_moving_average' ] ) and
+            indicators[ 'price' ][ -1 ] <= indicators[ 'sma_f' ][ -1 ] - ( indicators[ 'sma_f' ][ -1 ] * config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'buy_below_moving_average' ] ) and
 
             # RSI below the threshold
-            data.iloc[ -1 ][ ticker + '_RSI' ] <= config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'rsi_threshold' ]
+            indicators[ 'rsi' ][ -1 ] <= config[ 'trade_signals' ][ 'buy' ][ 'params' ][ 'rsi_threshold' ]
         )
 
-    def sell_above_buy( self, asset, data ):
+    def sell_above_buy( self, asset, data, indicators ):
         # Simple profit percentage
         #
         # Params: profit_percentage
         
         return (
-            data.iloc[ -1 ][ asset.ticker ] > asset.price + ( asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
+            indicators[ 'price' ][ -1 ] > asset.price + ( asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
         )
 
-    def sell_ema_crossover_rsi( self, asset, data ):
+    def sell_ema_crossover_rsi( self, asset, data, indicators ):
         # Exponential Moving Average Crossover with RSI Filter
         #
         # Params: profit_percentage, rsi_threshold
 
         return(
             # Make sure the data is valid
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_EMA_F' ] ) and
-            not isnan( data.iloc[ -2 ][ asset.ticker + '_EMA_F' ] ) and
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_EMA_S' ] ) and
-            not isnan( data.iloc[ -2 ][ asset.ticker + '_EMA_S' ] ) and
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_RSI' ] ) and
+            not isnan( indicators[ 'ema_f' ][ -1 ] ) and
+            not isnan( indicators[ 'ema_f' ][ -2 ] ) and
+            not isnan( indicators[ 'ema_s' ][ -1 ] ) and
+            not isnan( indicators[ 'ema_s' ][ -2 ] ) and
+            not isnan( indicators[ 'rsi' ][ -1 ] ) and
 
             # Fast-EMA crossed Slow-EMA from above
-            data.iloc[ -2 ][ asset.ticker + '_EMA_F' ] > data.iloc[ -2 ][ asset.ticker + '_EMA_S' ]  and
-            data.iloc[ -1 ][ asset.ticker + '_EMA_F' ] <= data.iloc[ -1 ][ asset.ticker + '_EMA_S' ]  and
+            indicators[ 'ema_f' ][ -2 ] > indicators[ 'ema_s' ][ -2 ]  and
+            indicators[ 'ema_f' ][ -1 ] <= indicators[ 'ema_s' ][ -1 ]  and
             
             # RSI below threshold
-            data.iloc[ -1 ][ asset.ticker + '_RSI' ] <= config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'rsi_threshold' ] and
+            indicators[ 'rsi' ][ -1 ] <= config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'rsi_threshold' ] and
 
             # Price is higher than purchase price by at least profit percentage
-            data.iloc[ -1 ][ asset.ticker ] >= asset.price + (  asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
+            indicators[ 'price' ][ -1 ] >= asset.price + (  asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
         )
 
-    def sell_price_ema_crossover_rsi( self, asset, data ):
+    def sell_price_ema_crossover_rsi( self, asset, data, indicators ):
         # Exponential Moving Average Crossover with RSI Filter
         #
         # Params: profit_percentage, rsi_threshold
 
         return(        
             # Make sure the data is valid
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_EMA_S' ] ) and
-            not isnan( data.iloc[ -2 ][ asset.ticker + '_EMA_S' ] ) and
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_RSI' ] ) and
+            not isnan( indicators[ 'ema_s' ][ -1 ] ) and
+            not isnan( indicators[ 'ema_s' ][ -2 ] ) and
+            not isnan( indicators[ 'rsi' ][ -1 ] ) and
 
             # Price crossed Slow-EMA from above
-            data.iloc[ -2 ][ asset.ticker ] > data.iloc[ -2 ][ asset.ticker + '_EMA_S' ]  and
-            data.iloc[ -1 ][ asset.ticker ] <= data.iloc[ -1 ][ asset.ticker + '_EMA_S' ]  and
+            indicators[ 'price' ][ -2 ] > indicators[ 'ema_s' ][ -2 ]  and
+            indicators[ 'price' ][ -1 ] <= indicators[ 'ema_s' ][ -1 ]  and
             
             # RSI below threshold
-            data.iloc[ -1 ][ asset.ticker + '_RSI' ] <= config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'rsi_threshold' ] and
+            indicators[ 'rsi' ][ -1 ] <= config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'rsi_threshold' ] and
 
             # Price is higher than purchase price by at least profit percentage
-            data.iloc[ -1 ][ asset.ticker ] >= asset.price + (  asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
+            indicators[ 'price' ][ -1 ] >= asset.price + (  asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
         )
 
-    def sell_sma_crossover_rsi( self, asset, data ):
+    def sell_sma_crossover_rsi( self, asset, data, indicators ):
         # Simple Moving Average Crossover with RSI Filter
         # Credits: https://trader.autochartist.com/moving-average-crossover-with-rsi-filter/
         #
@@ -131,21 +134,21 @@ class signals:
 
         return(        
             # Make sure the data is valid
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_SMA_F' ] ) and
-            not isnan( data.iloc[ -2 ][ asset.ticker + '_SMA_F' ] ) and
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_SMA_S' ] ) and
-            not isnan( data.iloc[ -2 ][ asset.ticker + '_SMA_S' ] ) and
-            not isnan( data.iloc[ -1 ][ asset.ticker + '_RSI' ] ) and
+            not isnan( indicators[ 'sma_f' ][ -1 ] ) and
+            not isnan( indicators[ 'sma_f' ][ -2 ] ) and
+            not isnan( indicators[ 'sma_s' ][ -1 ] ) and
+            not isnan( indicators[ 'sma_s' ][ -2 ] ) and
+            not isnan( indicators[ 'rsi' ][ -1 ] ) and
 
             # Fast-SMA crossed Slow-SMA from above
-            data.iloc[ -2 ][ asset.ticker + '_SMA_F' ] > data.iloc[ -2 ][ asset.ticker + '_SMA_S' ]  and
-            data.iloc[ -1 ][ asset.ticker + '_SMA_F' ] <= data.iloc[ -1 ][ asset.ticker + '_SMA_S' ]  and
+            indicators[ 'sma_f' ][ -2 ] > indicators[ 'sma_s' ][ -2 ]  and
+            indicators[ 'sma_f' ][ -1 ] <= indicators[ 'sma_s' ][ -1 ]  and
             
             # RSI below threshold
-            data.iloc[ -1 ][ asset.ticker + '_RSI' ] <= config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'rsi_threshold' ] and
+            indicators[ 'rsi' ][ -1 ] <= config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'rsi_threshold' ] and
 
             # Price is higher than purchase price by at least profit percentage
-            data.iloc[ -1 ][ asset.ticker ] >= asset.price + (  asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
+            indicators[ 'price' ][ -1 ] >= asset.price + (  asset.price * config[ 'trade_signals' ][ 'sell' ][ 'params' ][ 'profit_percentage' ] )
         )
 
     def sell_trailing_stop_loss( self, asset, data ):
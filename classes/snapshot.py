@@ -0,0 +1,94 @@
+import json
+import mmap
+from os import path, replace
+import struct
+from time import time, sleep
+
+# Latest state of the bot (prices, indicators, open positions), published in a
+# memory-mapped file at the end of each iteration, so that other processes
+# (dashboards, scripts) can read it without touching the bot or its pickle files.
+#
+# Layout: a fixed-size header followed by a JSON payload
+#   magic (8 bytes) | format version (uint32) | sequence (uint64) | payload length (uint64) | published at (float64)
+# The sequence works as a seqlock: the writer makes it odd before changing the
+# payload, and even again when it's done. Readers retry if the sequence was odd,
+# or changed while they were copying the payload
+
+class snapshot:
+    magic = b'RHBSNAP1'
+    format_version = 1
+    header = struct.Struct( '<8sIQQd' )
+    sequence_offset = 12
+
+    @staticmethod
+    def default_filename():
+        # Shared memory on Linux, a regular file (still mapped in memory) elsewhere
+        return '/dev/shm/rh-trading-bot.snapshot' if path.isdir( '/dev/shm' ) else 'pickle/snapshot.mmap'
+
+    def __init__( self, filename, size = 1048576, writer = False ):
+        self.filename = filename
+        self.writer = writer
+        self.sequence = 0
+
+        if writer:
+            # Readers may have the file mapped: never shrink it in place, replace it instead
+            if not path.exists( filename ) or path.getsize( filename ) != self.header.size + int( size ):
+                with open( filename + '.tmp', 'wb' ) as f:
+                    f.truncate( self.header.size + int( size ) )
+                    f.write( self.header.pack( self.magic, self.format_version, 0, 0, 0.0 ) )
+                replace( filename + '.tmp', filename )
+        elif not path.exists( filename ):
+            raise FileNotFoundError( 'Snapshot not found: ' + filename )
+
+        self.file = open( filename, 'r+b' if writer else 'rb' )
+        self.memory = mmap.mmap( self.file.fileno(), 0, access = mmap.ACCESS_WRITE if writer else mmap.ACCESS_READ )
+        self.capacity = len( self.memory ) - self.header.size
+
+        if writer:
+            # Keep counting from the previous run, so that the sequence never goes backwards for the readers
+            magic, version, sequence, length, published_at = self.header.unpack_from( self.memory, 0 )
+            self.sequence = sequence + ( sequence % 2 ) if magic == self.magic and version == self.format_version else 0
+            self.memory[ :self.header.size ] = self.header.pack( self.magic, self.format_version, self.sequence, length if self.sequence > 0 else 0, published_at if self.sequence > 0 else 0.0 )
+
+    def publish( self, record ):
+        payload = json.dumps( record, separators = ( ',', ':' ), default = str ).encode( 'utf8' )
+        if len( payload ) > self.capacity:
+            return False
+
+        # Odd sequence: write in progress
+        self.sequence += 1
+        struct.pack_into( '<Q', self.memory, self.sequence_offset, self.sequence )
+
+        self.memory[ self.header.size:self.header.size + len( payload ) ] = payload
+        struct.pack_into( '<Qd', self.memory, self.sequence_offset + 8, len( payload ), time() )
+
+        self.sequence += 1
+        struct.pack_into( '<Q', self.memory, self.sequence_offset, self.sequence )
+
+        return True
+
+    def read( self, retries = 1000 ):
+        # Returns ( sequence, published at, record ), or None if nothing has been published yet
+        for attempt in range( retries ):
+            magic, version, sequence, length, published_at = self.header.unpack_from( self.memory, 0 )
+
+            if magic != self.magic or version != self.format_version:
+                raise ValueError( 'Unsupported snapshot format in ' + self.filename )
+
+            if sequence == 0:
+                return None
+
+            if sequence % 2 == 1:
+                sleep( 0 )
+                continue
+
+            payload = self.memory[ self.header.size:self.header.size + length ]
+
+            if struct.unpack_from( '<Q', self.memory, self.sequence_offset )[ 0 ] == sequence:
+                return sequence, published_at, json.loads( payload )
+
+        raise TimeoutError( 'Could not read a consistent snapshot from ' + self.filename )
+
+    def close( self ):
+        self.memory.close()
+        self.file.close()
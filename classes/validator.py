@@ -0,0 +1,120 @@
+from collections import deque
+import logging
+import numpy as np
+
+# Streaming sanity checks on the prices retrieved at each iteration. Each ticker
+# is validated on its own: a quote that looks wrong only locks trading on that
+# ticker for the current iteration, while the others keep going. Counters for
+# each type of rejection are kept for monitoring purposes
+
+class validator:
+    counter_names = [ 'accepted', 'errors', 'outliers', 'repeated', 'stale', 'cross_source' ]
+
+    def __init__( self, tickers, window = 30, mad_threshold = 10.0, max_outliers = 3, max_percent_change = 30.0, repeated_values = 4, stale_minutes = 30, max_source_deviation = 0.02 ):
+        self.window = int( window )
+        self.mad_threshold = float( mad_threshold )
+        self.max_outliers = int( max_outliers )
+        self.max_percent_change = float( max_percent_change )
+        self.repeated_values = int( repeated_values )
+        self.stale_minutes = float( stale_minutes )
+        self.max_source_deviation = float( max_source_deviation )
+
+        self.history = {}
+        self.last_change = {}
+        self.outlier_streak = {}
+        self.counters = {}
+        self.locked = {}
+
+        for ticker in tickers:
+            self.history[ ticker ] = deque( maxlen = self.window )
+            self.last_change[ ticker ] = None
+            self.outlier_streak[ ticker ] = 0
+            self.counters[ ticker ] = { name: 0 for name in self.counter_names }
+
+        self.log = logging.getLogger( 'bot' )
+
+    def seed( self, data ):
+        # Prime the rolling windows with the most recent values in the dataset
+        for ticker in self.history:
+            self.history[ ticker ].clear()
+            self.last_change[ ticker ] = None
+
+            if ticker in data.columns:
+                for a_timestamp, a_price in zip( data[ 'timestamp' ].tail( self.window ), data[ ticker ].tail( self.window ) ):
+                    if not np.isnan( a_price ):
+                        if len( self.history[ ticker ] ) == 0 or self.history[ ticker ][ -1 ] != a_price:
+                            self.last_change[ ticker ] = a_timestamp
+                        self.history[ ticker ].append( float( a_price ) )
+
+    def check( self, ticker, price, now, quote_timestamp = None, reference_price = None ):
+        # Returns True if the price can be used, otherwise locks the ticker and records the reason
+        if price is None or np.isnan( price ):
+            return self.reject( ticker, 'errors', 'no price available' )
+
+        history = self.history[ ticker ]
+
+        if len( history ) > 0:
+            # Hard limit: more than max_percent_change away from the previous reading
+            percent_diff = abs( price - history[ -1 ] ) / history[ -1 ] * 100
+            if percent_diff > self.max_percent_change and not self.is_new_level( ticker, price ):
+                return self.reject( ticker, 'outliers', 'new price ($' + str( price ) + ') differs ' + str( round( percent_diff, 2 ) ) + '% from previous value' )
+
+        if len( history ) >= 5:
+            # Robust z-score based on the rolling median and median absolute deviation
+            values = np.fromiter( history, dtype = float, count = len( history ) )
+            median = np.median( values )
+            mad = np.median( np.abs( values - median ) ) * 1.4826
+            if mad > 0 and abs( price - median ) / mad > self.mad_threshold and not self.is_new_level( ticker, price ):
+                return self.reject( ticker, 'outliers', 'new price ($' + str( price ) + ') is ' + str( round( abs( price - median ) / mad, 1 ) ) + ' MADs away from the rolling median' )
+
+        # If the API is overloaded, it keeps returning the same value
+        if self.repeated_values > 1 and len( history ) >= self.repeated_values - 1 and all( x == price for x in list( history )[ -( self.repeated_values - 1 ): ] ):
+            return self.reject( ticker, 'repeated', 'repeating values detected' )
+
+        # Quote timestamps are used when the source provides them, otherwise the time since the price last changed
+        last_update = quote_timestamp if quote_timestamp is not None else ( self.last_change[ ticker ] if len( history ) > 0 and history[ -1 ] == price else None )
+        if self.stale_minutes > 0 and last_update is not None and ( now - last_update ).total_seconds() > self.stale_minutes * 60:
+            return self.reject( ticker, 'stale', 'price has not been updated since ' + str( last_update ) )
+
+        # The two data sources should roughly agree
+        if reference_price is not None and not np.isnan( reference_price ) and reference_price > 0 and abs( price - reference_price ) / reference_price > self.max_source_deviation:
+            return self.reject( ticker, 'cross_source', 'price ($' + str( price ) + ') deviates from the other source ($' + str( reference_price ) + ')' )
+
+        if len( history ) == 0 or history[ -1 ] != price:
+            self.last_change[ ticker ] = now
+
+        history.append( float( price ) )
+        self.outlier_streak[ ticker ] = 0
+        self.counters[ ticker ][ 'accepted' ] += 1
+        self.locked.pop( ticker, None )
+
+        return True
+
+    def is_new_level( self, ticker, price ):
+        # Several outliers in a row mean that the price moved to a new level: start over from there
+        self.outlier_streak[ ticker ] += 1
+
+        if self.max_outliers > 0 and self.outlier_streak[ ticker ] >= self.max_outliers:
+            self.log.warning( str( ticker ) + ' moved to a new price level ($' + str( price ) + '), resetting the rolling window.' )
+            self.history[ ticker ].clear()
+            return True
+
+        return False
+
+    def reject( self, ticker, reason, message ):
+        self.counters[ ticker ][ reason ] += 1
+        self.locked[ ticker ] = reason
+        self.log.warning( str( ticker ) + ' ' + message + ', locking this ticker.' )
+
+        return False
+
+    def lock( self, ticker, reason ):
+        # Lock a ticker for reasons that don't go through check() (e.g. API errors)
+        self.counters[ ticker ][ reason ] += 1
+        self.locked[ ticker ] = reason
+
+    def is_locked( self, ticker ):
+        return ticker in self.locked
+
+    def get_counters( self ):
+        return self.counters
@@ -14,7 +14,9 @@ config = {
     'ticker_list': { # list of coin ticker pairs Kraken/Robinhood (XETHZUSD/ETH, etc) - https://api.kraken.com/0/public/AssetPairs
         'XETHZUSD': 'ETH'
     }, 
-    'trade_signals': { # which strategies to use to generate entry/exit signals; see classes/signals.py for more info
+    'trade_signals': { # which strategies to use to generate entry/exit signals; see classes/signals.py and classes/registry.py for more info
+        # Instead of 'function', you can also define a signal as an expression on the indicators, for example:
+        # 'buy': { 'expression': 'rsi[-1] < rsi_threshold and price[-1] < sma_f[-1] * ( 1 - buy_below_moving_average )', 'params': { ... }, 'jit': False }
         'buy': {
             'function': 'ema_crossover_rsi',
             'params': {
@@ -48,5 +50,60 @@ config = {
         },
         'reserve': 0.0, # tell the bot if you don't want it to use all of the available cash in your account
         'stop_loss_threshold': 0.3 # sell if the price drops at least 30% below the purchase price
+    },
+    'portfolio': { # risk limits applied across all the assets
+        'max_exposure_per_ticker': 0.0, # if greater than zero, don't hold more than this amount of dollars in any single coin
+        'daily_loss_cap': 0.0, # if greater than zero, stop buying once the portfolio has lost this amount of dollars since midnight
+        'liquidate_on_loss_cap': False # if True, also sell all the assets when the daily loss cap is reached
+    },
+    'data_validation': { # sanity checks on each new price; a ticker that fails them is locked, while the others keep trading
+        'window': 30, # number of recent prices used to compute the rolling median
+        'mad_threshold': 10.0, # reject prices further than this many median absolute deviations from the rolling median
+        'max_outliers': 3, # after this many outliers in a row, assume the price moved to a new level and accept it
+        'max_percent_change': 30.0, # always reject prices that differ more than this percentage from the previous one
+        'repeated_values': 4, # reject a price if it's the same as the previous N-1 values (overloaded API)
+        'stale_minutes': 30, # reject a price that hasn't changed in this many minutes
+        'cross_check': False, # also retrieve prices from the other data source (Kraken/Robinhood) and compare them
+        'max_source_deviation': 0.02 # reject prices that differ more than this percentage (2%) from the other source
+    },
+    'paper_trading': { # run the same strategy on a virtual wallet, alongside the live bot, to compare results
+        'enabled': False,
+        'initial_cash': 1000.0, # starting balance of the virtual wallet (only used the first time)
+        'slippage': 0.001, # limit orders are placed this percentage (0.1%) above/below the current price
+        'fill_delay_seconds': 60 # orders can't be filled before this amount of time has passed
+    },
+    'logging': {
+        'level': 'INFO', # DEBUG, INFO, WARNING, ERROR
+        'folder': 'logs', # where to store status.log and ticks.jsonl
+        'max_bytes': 5242880, # rotate each log file when it reaches this size (5MB)
+        'backup_count': 5, # how many rotated files to keep
+        'console': False, # also print status messages to the standard output
+        'print_summary': False # also write the human-readable summary to status.log at each iteration (use ./status.py instead)
+    },
+    'snapshot': {
+        'enabled': True, # publish the latest state at each iteration, for ./status.py --live and other processes
+        'filename': '', # leave empty to use /dev/shm/rh-trading-bot.snapshot (or pickle/snapshot.mmap if /dev/shm is not available)
+        'size': 1048576 # maximum size of the published state (1MB)
+    },
+    'execution': {
+        'use_order_book': True, # price limit orders for their size, using the Kraken order book, instead of the top of the book alone
+        'order_book_depth': 100, # levels downloaded when the whole order book is refreshed
+        'order_book_refresh_depth': 10, # levels downloaded in between (the deeper ones are kept from the previous download)
+        'order_book_max_age_seconds': 15, # how long the order book can be reused before refreshing it
+        'order_book_full_refresh_seconds': 300, # how often to download the whole order book
+        'max_price_impact': 0.01, # never move the limit price more than this (1%) away from the best price
+        'reprice_every_seconds': 60, # how often to place unfilled orders again at the current price (0 = never, just cancel them after cancel_pending_after_minutes)
+        'max_reprices': 5 # how many times an order can be placed again at a new price
+    },
+    'memory': {
+        'budget_mb': 0, # when the bot gets close to using this much memory, closed orders and older data points are moved out of memory (0 = no budget)
+        'max_closed_orders': 500, # closed orders (sold or cancelled) kept in orders.pickle; older ones are archived in the ledger (0 = keep all)
+        'tracemalloc': False, # track memory allocations and report the top allocators in status.log (slows the bot down a little)
+        'report_every': 288, # iterations between two reports (288 x 5 minutes = 1 day)
+        'top_allocators': 10 # how many lines of code to list in each report
+    },
+    'recording': {
+        'enabled': False, # record everything the bot receives from Kraken and Robinhood, to replay it later with ./playback.py
+        'folder': 'sessions' # one compressed file per run of the bot (credentials are not recorded)
     }
 }
\ No newline at end of file
@@ -6,11 +6,25 @@
 
 from config import config
 from classes.asset import asset
+from classes.ledger import ledger
+from classes.memory import memory
+from classes.orderbook import orderbook
+from classes.paper import paper
+from classes.logger import logger
+from classes.portfolio import portfolio
+from classes.recording import recording, response
+from classes.registry import registry
 from classes.signals import signals
+from classes.snapshot import snapshot
+from classes.validator import validator
 
+import copy
 from datetime import datetime
+import gc
+import json
+import logging
 from math import floor
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 from os import path, makedirs
 import pandas as pd
@@ -21,8 +35,7 @@ from requests import get as get_json
 import robin_stocks.robinhood as rh
 import signal
 from talib import EMA, RSI, MACD
-from threading import Timer
-from time import sleep
+from time import sleep, perf_counter, monotonic
 
 class bot:
     default_config = {
@@ -76,6 +89,61 @@ class bot:
             },
             'reserve': 0.0,
             'stop_loss_threshold': 0.3,
+        },
+        'portfolio': {
+            'max_exposure_per_ticker': 0.0,
+            'daily_loss_cap': 0.0,
+            'liquidate_on_loss_cap': False
+        },
+        'data_validation': {
+            'window': 30,
+            'mad_threshold': 10.0,
+            'max_outliers': 3,
+            'max_percent_change': 30.0,
+            'repeated_values': 4,
+            'stale_minutes': 30,
+            'cross_check': False,
+            'max_source_deviation': 0.02
+        },
+        'paper_trading': {
+            'enabled': False,
+            'initial_cash': 1000.0,
+            'slippage': 0.001,
+            'fill_delay_seconds': 60
+        },
+        'logging': {
+            'level': 'INFO',
+            'folder': 'logs',
+            'max_bytes': 5242880,
+            'backup_count': 5,
+            'console': False,
+            'print_summary': False
+        },
+        'snapshot': {
+            'enabled': True,
+            'filename': '',
+            'size': 1048576
+        },
+        'execution': {
+            'use_order_book': True,
+            'order_book_depth': 100,
+            'order_book_refresh_depth': 10,
+            'order_book_max_age_seconds': 15,
+            'order_book_full_refresh_seconds': 300,
+            'max_price_impact': 0.01,
+            'reprice_every_seconds': 60,
+            'max_reprices': 5
+        },
+        'memory': {
+            'budget_mb': 0,
+            'max_closed_orders': 500,
+            'tracemalloc': False,
+            'report_every': 288,
+            'top_allocators': 10
+        },
+        'recording': {
+            'enabled': False,
+            'folder': 'sessions'
         }
     }
 
@@ -91,16 +159,32 @@ class bot:
     signal = signals()
 
     def __init__( self ):
-        # Set Pandas to output all columns in the dataframe
-        pd.set_option( 'display.max_columns', None )
-        pd.set_option( 'display.width', 300 )
-
         for c in self.default_config:
             isDefined = config.get( c )
             if not isDefined:
                 config[ c ] = self.default_config[ c ]
-        
-        print( '-- Init Environment ---------------------' )
+
+        # Status messages and tick records
+        self.logger = logger( config[ 'logging' ][ 'folder' ], config[ 'logging' ][ 'level' ], config[ 'logging' ][ 'max_bytes' ], config[ 'logging' ][ 'backup_count' ], config[ 'logging' ][ 'console' ] )
+        self.log = logging.getLogger( 'bot' )
+
+        self.log.info( 'Init Environment' )
+
+        # Where the current time comes from (can be replaced to run the bot on simulated time)
+        self.clock = datetime.now
+
+        # Recorded session, if any (see attach)
+        self.session = None
+
+        # Memory budget, and periodic reports on the top allocators (if enabled)
+        self.memory = memory( config[ 'memory' ][ 'budget_mb' ], trace = config[ 'memory' ][ 'tracemalloc' ], report_every = config[ 'memory' ][ 'report_every' ], top = config[ 'memory' ][ 'top_allocators' ] )
+
+        # Figures are created once per chart and reused at each iteration
+        self.charts = {}
+
+        # Order book depth, used to price limit orders
+        self.order_book = orderbook( config[ 'execution' ][ 'order_book_max_age_seconds' ], config[ 'execution' ][ 'order_book_full_refresh_seconds' ] )
+        self.kraken_tickers = { a_robinhood_ticker: a_kraken_ticker for a_kraken_ticker, a_robinhood_ticker in config[ 'ticker_list' ].items() }
 
         # Initialize folders where to store data and charts
         if not path.exists( 'pickle' ):
@@ -111,29 +195,59 @@ class bot:
 
         if path.exists( 'pickle/orders.pickle' ):
             # Load state
-            print( 'Loading saved orders' )
+            self.log.info( 'Loading saved orders' )
             with open( 'pickle/orders.pickle', 'rb' ) as f:
                 self.orders = pickle.load( f )
         else:
             # Start from scratch
-            print( 'No state saved, starting from scratch' )
+            self.log.info( 'No state saved, starting from scratch' )
 
         # Load data points
         if path.exists( 'pickle/dataframe.pickle' ):
-            print( 'Loading saved dataset' )
+            self.log.info( 'Loading saved dataset' )
             self.data = pd.read_pickle( 'pickle/dataframe.pickle' )
 
+        # Indexed copy of the orders, used by manage-assets.py for reporting
+        self.ledger = ledger( 'pickle/ledger.sqlite' )
+
+        # Positions and P&L across all the assets
+        self.portfolio = portfolio( config[ 'ticker_list' ].values(), config[ 'portfolio' ][ 'max_exposure_per_ticker' ], config[ 'portfolio' ][ 'daily_loss_cap' ] )
+        # Peaks, drawdowns and the P&L at the start of the day are saved in the ledger, so that a restart doesn't reset the daily loss cap
+        portfolio_state = self.ledger.get_meta( 'portfolio' )
+        self.portfolio.rebuild( self.orders, self.ledger.get_archived_profit(), json.loads( portfolio_state ) if portfolio_state is not None else None )
+
+        # Per-ticker checks on the incoming prices
+        self.validator = validator(
+            config[ 'ticker_list' ].values(),
+            window = config[ 'data_validation' ][ 'window' ],
+            mad_threshold = config[ 'data_validation' ][ 'mad_threshold' ],
+            max_outliers = config[ 'data_validation' ][ 'max_outliers' ],
+            max_percent_change = config[ 'data_validation' ][ 'max_percent_change' ],
+            repeated_values = config[ 'data_validation' ][ 'repeated_values' ],
+            stale_minutes = config[ 'data_validation' ][ 'stale_minutes' ],
+            max_source_deviation = config[ 'data_validation' ][ 'max_source_deviation' ]
+        )
+
+        if self.data.shape[ 0 ] > 0:
+            self.validator.seed( self.data )
+
         # Connect to Robinhood
         if not config[ 'bot' ][ 'simulate_api_calls' ]:
             try:
-                print( 'Logging in to Robinhood' )
+                self.log.info( 'Logging in to Robinhood' )
                 totp = pyotp.TOTP( config[ 'bot' ][ 'totp' ] ).now()
                 rh_response = rh.login( config[ 'bot' ][ 'username' ], config[ 'bot' ][ 'password' ], mfa_code = totp )
             except Exception as e:
-                print( 'Got exception while attempting to log into Robinhood.' )
-                print( e )
+                self.log.error( 'Got exception while attempting to log into Robinhood: ' + str( e ) )
                 exit()
 
+        # Resolve the buy/sell signals and validate their parameters before we start trading
+        try:
+            self.registry = registry( self.signal, config[ 'trade_signals' ], config[ 'ticker_list' ].values() )
+        except ValueError as e:
+            self.log.error( 'Invalid trade_signals configuration: ' + str( e ) )
+            exit()
+
         # Download Robinhood parameters
         for a_robinhood_ticker in config[ 'ticker_list' ].values():
             if not config[ 'bot' ][ 'simulate_api_calls' ]:
@@ -143,7 +257,7 @@ class bot:
                     self.min_price_increments.update( { a_robinhood_ticker: float( result[ 'min_order_price_increment' ] ) } )
                     self.api_error_counter = 0
                 except:
-                    print( 'Failed to get increments from RobinHood.' )
+                    self.log.error( 'Failed to get increments from RobinHood.' )
                     exit()
             else:
                 self.min_share_increments.update( { a_robinhood_ticker: 0.0001 } )
@@ -152,11 +266,36 @@ class bot:
         # How much cash do we have?
         self.update_available_cash()
 
+        # Virtual wallet for paper trading, fed with the same prices and signals as the live bot
+        self.paper = None
+        if config[ 'paper_trading' ][ 'enabled' ]:
+            self.log.info( 'Paper trading enabled' )
+            self.paper = paper(
+                config[ 'ticker_list' ].values(),
+                'pickle/paper.pickle',
+                initial_cash = config[ 'paper_trading' ][ 'initial_cash' ],
+                slippage = config[ 'paper_trading' ][ 'slippage' ],
+                fill_delay_seconds = config[ 'paper_trading' ][ 'fill_delay_seconds' ],
+                cancel_pending_after_minutes = config[ 'bot' ][ 'cancel_pending_after_minutes' ],
+                min_share_increments = self.min_share_increments,
+                min_price_increments = self.min_price_increments,
+                max_exposure_per_ticker = config[ 'portfolio' ][ 'max_exposure_per_ticker' ],
+                daily_loss_cap = config[ 'portfolio' ][ 'daily_loss_cap' ]
+            )
+
+        # Latest state, shared with other processes through a memory-mapped file
+        self.snapshot = None
+        if config[ 'snapshot' ][ 'enabled' ]:
+            try:
+                self.snapshot = snapshot( config[ 'snapshot' ][ 'filename' ] or snapshot.default_filename(), config[ 'snapshot' ][ 'size' ], writer = True )
+            except OSError as e:
+                self.log.warning( 'Could not create the snapshot file: ' + str( e ) )
+
         # Install signal handlers
         signal.signal( signal.SIGTERM, self.handle_exit )
         signal.signal( signal.SIGINT, self.handle_exit )
 
-        print( 'Bot Ready' )
+        self.log.info( 'Bot Ready' )
 
         return
 
@@ -165,124 +304,149 @@ class bot:
         if self.api_error_counter > 4:
             exit()
 
-        now = datetime.now()
+        now = self.clock()
+        tick_start = perf_counter()
         
         # Update available cash just in case human buys manually
         self.update_available_cash()
 
         # We don't have enough consecutive data points to decide what to do
         is_trading_locked = not self.get_new_data( now )
-        
-        if len( self.orders ) > 0:
-            print( '-- Assets -------------------------------' )
-
-            # Is any of our orders not filled? (swing/miss)
-            pending_orders = []
-            is_table_header_printed = False
-            for a_asset in self.orders.values():
-                if a_asset.status in [ 'PB', 'PS' ]:
-                    print( 'Checking pending orders' )
-
-                    # Retrieve the list of pending orders, if we haven't already
-                    if len( pending_orders ) == 0 and config[ 'bot' ][ 'trades_enabled' ] and not config[ 'bot' ][ 'simulate_api_calls' ]:
-                        try:
-                            pending_orders = rh.get_all_open_crypto_orders()
-                            self.api_error_counter = 0
-                        except:
-                            print( 'An exception occurred while retrieving list of pending orders.' )
-                            self.api_error_counter = self.api_error_counter + 1
-                            pending_orders = []
-
-                    # Is this order still pending?
-                    for a_order in pending_orders:
-                        if a_order[ 'id' ] == a_asset.order_id:
-                            # Mark this order as cancelled so that we can remove it during garbage collection
-                            a_asset.status = 'C' + str( a_asset.status )
-
-                    # Was this asset marked as "to be cancelled?"
-                    timediff = now - a_asset.timestamp
-                    if a_asset.status in [ 'CPB', 'CPS' ] and timediff.seconds > config[ 'bot' ][ 'cancel_pending_after_minutes' ] * 60:
-                        self.cancel_order( a_asset.order_id )
-                    else:
-                        # If it wasn't marked as 'to be cancelled', the order can be confirmed (remove the 'P' in front of the status)
-                        # If it's not time to cancel it yet, remove the 'C' in front of the status
-                        a_asset.status = a_asset.status[1:]
-
-                        # If we confirmed that this asset was sold, we can update the available cash balance
-                        if a_asset.status == 'S':
-                            self.update_available_cash()
-
-                # Print a summary of all confirmed assets
-                if a_asset.status in [ 'B', 'PB', 'PS' ]:
-                    if not is_table_header_printed:
-                        print( "{:<16}  {:<6}  {:<12}  {:<12}  {:<12}  {:<12}".format( 'Date/Time', 'Ticker', 'Quantity', 'Price', 'Cost', 'Value' ) )
-                        is_table_header_printed = True
 
-                    try:
-                        print( "{:<16}  {:<6}  {:<12}  {:<12}  {:<12}  {:<12}".format( a_asset.timestamp.strftime( '%Y-%m-%d %H:%M' ), str( a_asset.ticker ), str( a_asset.quantity ), str( a_asset.price ), str( round( a_asset.price * a_asset.quantity, 3 ) ), str( round( self.data.iloc[ -1 ][ a_asset.ticker ] * a_asset.quantity, 3 ) ) ) )
-                    except IndexError:
-                        print( "{:<16}  {:<6}  {:<12}  {:<12}  {:<12}  {:<12}".format( a_asset.timestamp.strftime( '%Y-%m-%d %H:%M' ), str( a_asset.ticker ), str( a_asset.quantity ), str( a_asset.price ), str( round( a_asset.price * a_asset.quantity, 3 ) ), 'N/A' ) )
+        # Refresh the valuation of all positions in one pass
+        if self.data.shape[ 0 ] > 0:
+            self.portfolio.update( self.data.iloc[ -1 ].reindex( self.portfolio.tickers ).to_numpy( dtype = float ), now )
 
+        # Raw indicator values for the signals, extracted once for all tickers
+        self.registry.prepare( self.data )
+
+        if len( self.orders ) > 0:
+            # Confirm, reprice or cancel the orders placed during the previous iterations
+            self.process_pending_orders( now )
+
+            for a_asset in list( self.orders.values() ):
                 if a_asset.status == 'B':
                     # Is it time to sell this asset? ( Stop-loss: is the current price below the purchase price by the percentage defined in the config file? )
-                    if not is_trading_locked and ( getattr( self.signal, 'sell_' + str( config[ 'trade_signals' ][ 'sell' ][ 'function' ] ) )( a_asset, self.data ) or self.data.iloc[ -1 ][ a_asset.ticker ] < a_asset.price - ( a_asset.price * config[ 'assets' ][ 'stop_loss_threshold' ] ) ):
+                    # Portfolio-level stop: liquidate everything if the daily loss cap was hit (when enabled)
+                    if not is_trading_locked and not self.validator.is_locked( a_asset.ticker ) and ( self.registry.sell( a_asset, self.data ) or self.is_stop_loss( a_asset ) ):
                         self.sell( a_asset )
                         # During the following iteration we will confirm if this limit order was actually executed, and update the available cash balance accordingly
 
-            if not is_table_header_printed:
-                print( 'No assets found.')
-
         # Is it time to buy something?
+        buy_signals = {}
         for a_robinhood_ticker in config[ 'ticker_list' ].values():
-            if not is_trading_locked and getattr( self.signal, 'buy_' + str(  config[ 'trade_signals' ][ 'buy' ][ 'function' ] ) )( a_robinhood_ticker, self.data ) and self.buy( a_robinhood_ticker ):
-                self.update_available_cash()              
+            buy_signals[ a_robinhood_ticker ] = not is_trading_locked and not self.validator.is_locked( a_robinhood_ticker ) and self.registry.buy( a_robinhood_ticker, self.data )
+            if buy_signals[ a_robinhood_ticker ] and self.buy( a_robinhood_ticker ):
+                self.update_available_cash()
+
+        # Run the same signals against the virtual wallet
+        if self.paper is not None and not is_trading_locked:
+            self.paper.run( now, self.data, self.registry, buy_signals, self.validator.locked, config[ 'assets' ][ 'buy_amount_per_trade' ], config[ 'assets' ][ 'stop_loss_threshold' ], config[ 'portfolio' ][ 'liquidate_on_loss_cap' ] )
 
-        # Only track up to a fixed amount of data points
-        self.data = self.data.tail( config[ 'bot' ][ 'max_data_rows' ] )
+        # Closed orders and old data points are moved out of memory when we reach the limits
+        self.enforce_memory_limits()
 
         # Final status for this iteration
-        print( '-- Bot Status ---------------------------' )
-        print( 'Iteration completed on ' + str( now.strftime( '%Y-%m-%d %H:%M' ) ) )
-        print( 'Buying power: $' + str( self.available_cash ) )
-        print( '-- Data Snapshot ------------------------' )
-        print( self.data.tail() )
+        self.log_tick( now, perf_counter() - tick_start )
 
         # Save state
-        with open( 'pickle/orders.pickle', 'wb' ) as f:
-            pickle.dump( self.orders, f )
+        self.save_state()
 
-        self.data.to_pickle( 'pickle/dataframe.pickle' )
+        self.memory.tick()
+
+    def loop( self ):
+        # Iterations run one after the other on the main thread, every minutes_between_updates; in between, open orders are repriced on a shorter schedule
+        while True:
+            started = monotonic()
+            self.run()
+
+            while True:
+                remaining = config[ 'bot' ][ 'minutes_between_updates' ] * 60 - ( monotonic() - started )
+                if config[ 'execution' ][ 'reprice_every_seconds' ] <= 0 or remaining <= config[ 'execution' ][ 'reprice_every_seconds' ]:
+                    sleep( max( 0, remaining ) )
+                    break
+
+                sleep( config[ 'execution' ][ 'reprice_every_seconds' ] )
+                self.check_orders()
+
+    def check_orders( self ):
+        # Between iterations, only the pending orders are checked (paper orders too, at the prices retrieved by the last iteration)
+        now = self.clock()
+        is_changed = self.process_pending_orders( now )
 
-        # Schedule the next iteration
-        timer_handle = Timer( config[ 'bot' ][ 'minutes_between_updates' ] * 60, self.run )
-        timer_handle.daemon = True
-        timer_handle.start()
-        timer_handle.join()
+        if self.paper is not None and self.paper.check( now, self.data ):
+            is_changed = True
 
-    def buy( self, ticker ):
+        if is_changed:
+            self.save_state()
+
+    def attach( self, session ):
+        # The current time and the beginning of each pass are recorded too, so that a replay can reproduce the same sequence
+        self.session = session
+        self.clock = session.wrap( 'clock', self.clock, repeat_last = True )
+        self.run = session.wrap_pass( 'run', self.run )
+        self.check_orders = session.wrap_pass( 'check_orders', self.check_orders )
+
+    def enforce_memory_limits( self ):
+        is_near_limit = self.memory.is_near_limit()
+
+        # Above max_closed_orders (or when we're close to the memory budget), the oldest closed orders are only kept in the ledger
+        max_closed_orders = 0 if is_near_limit else config[ 'memory' ][ 'max_closed_orders' ]
+        if max_closed_orders > 0 or is_near_limit:
+            closed = [ a_asset for a_asset in self.orders.values() if a_asset.status in [ 'S', 'C' ] ]
+
+            if len( closed ) > max_closed_orders:
+                closed.sort( key = lambda x: x.timestamp )
+                closed = closed[ :len( closed ) - max_closed_orders ]
+
+                try:
+                    self.ledger.archive( closed )
+                    for a_asset in closed:
+                        self.orders.pop( a_asset.order_id )
+                    self.log.info( 'Archived ' + str( len( closed ) ) + ' closed orders to the ledger' )
+                except Exception as e:
+                    self.log.error( 'An exception occurred while archiving closed orders: ' + str( e ) )
+
+            if self.paper is not None:
+                self.paper.archive( max_closed_orders )
+
+        if is_near_limit:
+            # Keep only the data points needed by the indicators
+            min_data_rows = 2 * max( config[ 'ta' ][ 'rsi_period' ], config[ 'ta' ][ 'moving_average_periods' ][ 'sma_slow' ], config[ 'ta' ][ 'moving_average_periods' ][ 'ema_slow' ], config[ 'ta' ][ 'moving_average_periods' ][ 'macd_slow' ] + config[ 'ta' ][ 'moving_average_periods' ][ 'macd_signal' ] )
+            max_data_rows = max( min_data_rows, config[ 'bot' ][ 'max_data_rows' ] // 2 )
+
+            if self.data.shape[ 0 ] > max_data_rows:
+                self.data = self.data.iloc[ -max_data_rows: ].reset_index( drop = True )
+
+            gc.collect()
+            self.log.warning( 'Memory usage (' + str( round( self.memory.get_usage(), 1 ) ) + ' MB) is close to the budget of ' + str( config[ 'memory' ][ 'budget_mb' ] ) + ' MB: closed orders archived, dataset reduced to ' + str( self.data.shape[ 0 ] ) + ' data points' )
+
+    def buy( self, ticker, quantity = None, reprices = 0 ):
+        # quantity is only set when an unfilled order is placed again at a new price
         if self.available_cash == 0 or self.available_cash < config[ 'assets' ][ 'buy_amount_per_trade' ][ 'min' ]:
             return False
-        
-        # Retrieve the actual ask price from Robinhood
-        if not config[ 'bot' ][ 'simulate_api_calls' ]:
-            try:
-                quote = rh.get_crypto_quote( ticker )
-                price = float( quote[ 'ask_price' ] )
-                self.api_error_counter = 0
-            except:
-                print( 'Could not retrieve ask price from Robinhood. Using most recent value.' )
-                self.api_error_counter = self.api_error_counter + 1
-                price = self.data.iloc[ -1 ][ ticker ]
+
+        if quantity is None:
+            # How much to buy depends on the configuration and on the portfolio risk limits
+            amount = self.portfolio.get_buy_allowance( ticker, self.available_cash if ( config[ 'assets' ][ 'buy_amount_per_trade' ][ 'max' ] == 0 ) else min( self.available_cash, config[ 'assets' ][ 'buy_amount_per_trade' ][ 'max' ] ) )
+            if amount <= 0 or amount < config[ 'assets' ][ 'buy_amount_per_trade' ][ 'min' ]:
+                self.log.warning( 'Not buying ' + str( ticker ) + ': portfolio risk limits reached' )
+                return False
+
+            # Price at which an order for this amount is expected to be filled
+            price = self.get_execution_price( ticker, 'buy', amount = amount )
         else:
-            price = self.data.iloc[ -1 ][ ticker ]
+            price = self.get_execution_price( ticker, 'buy', quantity = quantity )
 
-        # Values need to be specified to no more precision than listed in min_price_increments.
-        # Truncate to 7 decimal places to avoid floating point problems way out at the precision limit
-        price_precision = round( floor( price / self.min_price_increments[ ticker ] ) * self.min_price_increments[ ticker ], 7 )
-        
-        # How much to buy depends on the configuration
-        quantity = ( self.available_cash if ( config[ 'assets' ][ 'buy_amount_per_trade' ][ 'max' ] == 0 ) else min( self.available_cash, config[ 'assets' ][ 'buy_amount_per_trade' ][ 'max' ] ) ) / price_precision
-        quantity = round( floor( quantity / self.min_share_increments[ ticker ] ) * self.min_share_increments[ ticker ], 7 )
+        price_precision = self.round_price( ticker, price )
+
+        if quantity is None:
+            quantity = self.round_quantity( ticker, amount / price_precision )
+        else:
+            quantity = self.round_quantity( ticker, min( quantity, self.available_cash / price_precision ) )
+
+        if quantity <= 0:
+            return False
 
         if config[ 'bot' ][ 'trades_enabled' ] and not config[ 'bot' ][ 'simulate_api_calls' ]:
             try:
@@ -290,40 +454,32 @@ class bot:
 
                 # Add this new asset to our orders
                 self.orders[ buy_info[ 'id' ] ] = asset( ticker, quantity, price_precision, buy_info[ 'id' ], 'PB' )
+                self.orders[ buy_info[ 'id' ] ].timestamp = self.clock()
+                self.orders[ buy_info[ 'id' ] ].limit_price = price_precision
+                self.orders[ buy_info[ 'id' ] ].submitted_at = self.orders[ buy_info[ 'id' ] ].timestamp
+                self.orders[ buy_info[ 'id' ] ].reprices = reprices
+                self.portfolio.open( self.orders[ buy_info[ 'id' ] ] )
 
-                print( '## Submitted order to buy ' +  str( quantity ) + ' ' + str( ticker ) + ' at $' + str( price_precision ) )
+                self.log.info( 'Submitted order to buy ' +  str( quantity ) + ' ' + str( ticker ) + ' at $' + str( price_precision ) )
                 
                 if ( price != self.data.iloc[ -1 ][ ticker ] ):
-                    print( '## Price Difference: Mark $' + str( self.data.iloc[ -1 ][ ticker ] ) + ', Ask $' + str( price ) )
+                    self.log.info( 'Price Difference: Mark $' + str( self.data.iloc[ -1 ][ ticker ] ) + ', Ask $' + str( price ) )
 
                 self.api_error_counter = 0
             except:
-                print( 'An exception occurred while trying to buy.' )
+                self.log.error( 'An exception occurred while trying to buy.' )
                 self.api_error_counter = self.api_error_counter + 1
                 return False
         else:
-            print( '## Would have bought ' + str( ticker ) + ' ' + str( quantity ) + ' at $' + str( price_precision ) + ', if trades were enabled' )
+            self.log.info( 'Would have bought ' + str( ticker ) + ' ' + str( quantity ) + ' at $' + str( price_precision ) + ', if trades were enabled' )
             return False
 
         return True
 
-    def sell( self, asset ):
-        # Retrieve the actual bid price from Robinhood
-        if not config[ 'bot' ][ 'simulate_api_calls' ]:
-            try:
-                quote = rh.get_crypto_quote( asset.ticker )
-                price = float( quote[ 'bid_price' ] )
-                self.api_error_counter = 0
-            except:
-                print( 'Could not retrieve bid price from Robinhood. Using most recent value.' )
-                self.api_error_counter = self.api_error_counter + 1
-                price = self.data.iloc[ -1 ][ asset.ticker ]
-        else:
-            price = self.data.iloc[ -1 ][ asset.ticker ]
-
-        # Values needs to be specified to no more precision than listed in min_price_increments. 
-        # Truncate to 7 decimal places to avoid floating point problems way out at the precision limit
-        price_precision = round( floor( price / self.min_price_increments[ asset.ticker ] ) * self.min_price_increments[ asset.ticker ], 7 )
+    def sell( self, asset, reprices = 0 ):
+        # Price at which an order for this quantity is expected to be filled
+        price = self.get_execution_price( asset.ticker, 'sell', quantity = asset.quantity )
+        price_precision = self.round_price( asset.ticker, price )
         profit = round( ( asset.quantity * price_precision ) - ( asset.quantity * asset.price ), 3 )
 
         if config[ 'bot' ][ 'trades_enabled' ] and not config[ 'bot' ][ 'simulate_api_calls' ]:
@@ -333,23 +489,168 @@ class bot:
                 # Mark this asset as pending sold
                 self.orders[ asset.order_id ].status = 'PS'
                 self.orders[ asset.order_id ].profit = profit
+                self.orders[ asset.order_id ].sell_order_id = sell_info[ 'id' ]
+                self.orders[ asset.order_id ].limit_price = price_precision
+                self.orders[ asset.order_id ].submitted_at = self.clock()
+                self.orders[ asset.order_id ].reprices = reprices
 
-                print( '## Submitted order to sell ' + str( asset.quantity ) + ' ' + str( asset.ticker ) + ' at $' + str( price_precision ) + ' (estimated profit: $' + str( profit ) + ')' )
+                self.log.info( 'Submitted order to sell ' + str( asset.quantity ) + ' ' + str( asset.ticker ) + ' at $' + str( price_precision ) + ' (estimated profit: $' + str( profit ) + ')' )
             
                 if ( price != self.data.iloc[ -1 ][ asset.ticker ] ):
-                    print( '## Price Difference: Mark $' + str( self.data.iloc[ -1 ][ asset.ticker ] ) + ', Bid $' + str( price ) )
+                    self.log.info( 'Price Difference: Mark $' + str( self.data.iloc[ -1 ][ asset.ticker ] ) + ', Bid $' + str( price ) )
             
                 self.api_error_counter = 0
             except:
-                print( 'An exception occurred while trying to sell.' )
+                self.log.error( 'An exception occurred while trying to sell.' )
                 self.api_error_counter = self.api_error_counter + 1
                 return False
         else:
-            print( '## Would have sold ' + str( asset.ticker ) + ' ' + str( asset.quantity ) + ' at $' + str( price_precision ) + ', if trades were enabled' )
+            self.log.info( 'Would have sold ' + str( asset.ticker ) + ' ' + str( asset.quantity ) + ' at $' + str( price_precision ) + ', if trades were enabled' )
             return False
 
         return True
 
+    def round_price( self, ticker, price ):
+        # Values need to be specified to no more precision than listed in min_price_increments.
+        # Truncate to 7 decimal places to avoid floating point problems way out at the precision limit
+        return round( floor( price / self.min_price_increments[ ticker ] ) * self.min_price_increments[ ticker ], 7 )
+
+    def round_quantity( self, ticker, quantity ):
+        return round( floor( quantity / self.min_share_increments[ ticker ] ) * self.min_share_increments[ ticker ], 7 )
+
+    def get_execution_price( self, ticker, side, quantity = None, amount = None ):
+        # Best price on Robinhood (ask to buy, bid to sell), moved by how far an order of this size would go into the Kraken order book
+        price = None
+
+        if not config[ 'bot' ][ 'simulate_api_calls' ]:
+            try:
+                quote = rh.get_crypto_quote( ticker )
+                price = float( quote[ 'ask_price' if side == 'buy' else 'bid_price' ] )
+                self.api_error_counter = 0
+            except:
+                self.log.warning( 'Could not retrieve ' + ( 'ask' if side == 'buy' else 'bid' ) + ' price from Robinhood.' )
+                self.api_error_counter = self.api_error_counter + 1
+
+            fill = self.get_order_book_fill( ticker, side, quantity, amount ) if config[ 'execution' ][ 'use_order_book' ] else None
+            if fill is not None:
+                if price is None:
+                    price = fill[ 'best' ]
+
+                # Capped, in case the book is too thin to be trusted
+                impact = min( abs( fill[ 'limit' ] / fill[ 'best' ] - 1 ), config[ 'execution' ][ 'max_price_impact' ] )
+                price = price * ( 1 + impact ) if side == 'buy' else price * ( 1 - impact )
+                self.log.debug( 'Order book for ' + str( ticker ) + ': best $' + str( fill[ 'best' ] ) + ', expected average fill $' + str( round( fill[ 'average' ], 7 ) ) + ', last level $' + str( fill[ 'limit' ] ) )
+
+        if price is None:
+            # Simulated orders are priced at the last mark on purpose, no need to warn about it
+            if not config[ 'bot' ][ 'simulate_api_calls' ]:
+                self.log.warning( 'Using most recent value for ' + str( ticker ) + '.' )
+
+            price = self.data.iloc[ -1 ][ ticker ]
+
+        return price
+
+    def get_order_book_fill( self, ticker, side, quantity = None, amount = None ):
+        kraken_ticker = self.kraken_tickers[ ticker ]
+        now = self.clock()
+
+        # The whole book is downloaded every few minutes, only the top levels in between
+        if self.order_book.is_stale( kraken_ticker, now ):
+            is_full_refresh = self.order_book.needs_full_refresh( kraken_ticker, now )
+
+            try:
+                result = get_json( 'https://api.kraken.com/0/public/Depth?pair=' + str( kraken_ticker ) + '&count=' + str( config[ 'execution' ][ 'order_book_depth' if is_full_refresh else 'order_book_refresh_depth' ] ) ).json()
+                if len( result[ 'error' ] ) > 0:
+                    raise ValueError( ', '.join( result[ 'error' ] ) )
+
+                self.order_book.update( kraken_ticker, result[ 'result' ][ kraken_ticker ][ 'asks' ], result[ 'result' ][ kraken_ticker ][ 'bids' ], now, is_full_refresh )
+            except Exception as e:
+                self.log.warning( 'Could not retrieve the order book for ' + str( kraken_ticker ) + ' from Kraken: ' + str( e ) )
+                return None
+
+        return self.order_book.get_fill( kraken_ticker, side, quantity, amount )
+
+    def get_exchange_order_id( self, a_asset ):
+        # Sell orders have their own ID on Robinhood
+        return a_asset.sell_order_id if a_asset.status == 'PS' and a_asset.sell_order_id != '' else a_asset.order_id
+
+    def process_pending_orders( self, now ):
+        # Returns True if there were pending orders to check
+        pending = [ a_asset for a_asset in self.orders.values() if a_asset.status in [ 'PB', 'PS' ] ]
+        if len( pending ) == 0:
+            return False
+
+        # Retrieve the list of open orders once for all our pending ones
+        open_orders = {}
+        if config[ 'bot' ][ 'trades_enabled' ] and not config[ 'bot' ][ 'simulate_api_calls' ]:
+            try:
+                open_orders = { a_order[ 'id' ]: a_order for a_order in rh.get_all_open_crypto_orders() }
+                self.api_error_counter = 0
+            except:
+                self.log.error( 'An exception occurred while retrieving list of pending orders.' )
+                self.api_error_counter = self.api_error_counter + 1
+                return False
+
+        for a_asset in pending:
+            self.log.debug( 'Checking pending order #' + str( self.get_exchange_order_id( a_asset ) ) )
+
+            if self.get_exchange_order_id( a_asset ) in open_orders:
+                # Not filled yet (swing/miss): place it again at the current price, or give up on it
+                if a_asset.cancel_reason == '':
+                    self.manage_open_order( a_asset, now )
+            elif a_asset.cancel_reason != '':
+                # Our cancel request went through, or the order was filled in the meantime
+                self.complete_cancel( a_asset )
+            else:
+                self.confirm_order( a_asset )
+
+        return True
+
+    def confirm_order( self, a_asset ):
+        # The order was filled: remove the 'P' in front of the status
+        a_asset.status = a_asset.status[ 1: ]
+
+        # If we confirmed that this asset was sold, we can update the available cash balance
+        if a_asset.status == 'S':
+            a_asset.sold_at = self.clock()
+            self.portfolio.close( a_asset )
+            self.update_available_cash()
+
+    def manage_open_order( self, a_asset, now ):
+        elapsed = ( now - ( a_asset.submitted_at if a_asset.submitted_at is not None else a_asset.timestamp ) ).total_seconds()
+
+        if elapsed > config[ 'bot' ][ 'cancel_pending_after_minutes' ] * 60:
+            return self.cancel_order( a_asset )
+
+        if config[ 'execution' ][ 'reprice_every_seconds' ] <= 0 or a_asset.reprices >= config[ 'execution' ][ 'max_reprices' ] or elapsed < config[ 'execution' ][ 'reprice_every_seconds' ]:
+            return False
+
+        # Only replace the order if the market moved away from our limit price
+        price = self.round_price( a_asset.ticker, self.get_execution_price( a_asset.ticker, 'buy' if a_asset.status == 'PB' else 'sell', quantity = a_asset.quantity ) )
+        if price == a_asset.limit_price:
+            return False
+
+        # Chase the market only while the reason for the order still holds: otherwise just cancel it
+        if not self.is_reprice_allowed( a_asset, price ):
+            self.log.info( 'Not repricing order for ' + str( a_asset.ticker ) + ' at $' + str( price ) + ': the ' + ( 'buy' if a_asset.status == 'PB' else 'sell' ) + ' signal no longer holds.' )
+            return self.cancel_order( a_asset )
+
+        return self.cancel_order( a_asset, 'reprice' )
+
+    def is_reprice_allowed( self, a_asset, price ):
+        if a_asset.status == 'PB':
+            return not self.validator.is_locked( a_asset.ticker ) and self.registry.buy( a_asset.ticker, self.data )
+
+        # Stop-loss sales get out at any price; the others must still be profitable at the new limit price
+        if self.is_stop_loss( a_asset ):
+            return True
+
+        return price > a_asset.price and self.registry.sell( a_asset, self.data )
+
+    def is_stop_loss( self, a_asset ):
+        # Is the current price below the purchase price by the percentage defined in the config file, or was the daily loss cap hit (when liquidating is enabled)?
+        return self.data.iloc[ -1 ][ a_asset.ticker ] < a_asset.price - ( a_asset.price * config[ 'assets' ][ 'stop_loss_threshold' ] ) or ( config[ 'portfolio' ][ 'liquidate_on_loss_cap' ] and self.portfolio.is_loss_cap_breached() )
+
     def data_has_gaps( self, now ):
         if self.data.shape[ 0 ] <= 1:
             return True
@@ -375,7 +676,7 @@ class bot:
         return False
 
     def init_data( self ):
-        print( 'Starting with a fresh dataset.' )
+        self.log.info( 'Starting with a fresh dataset.' )
 
         # Download historical data from Kraken
         column_names = [ 'timestamp' ]
@@ -395,7 +696,7 @@ class bot:
                 # Be nice to the Kraken API
                 sleep( 3 )
             except:
-                print( 'An exception occurred retrieving historical data from Kraken.' )
+                self.log.error( 'An exception occurred retrieving historical data from Kraken.' )
                 self.api_error_counter = self.api_error_counter + 1
                 return False
 
@@ -413,61 +714,84 @@ class bot:
             self.data[ a_robinhood_ticker + '_RSI' ] = RSI( self.data[ a_robinhood_ticker ].values, timeperiod = config[ 'ta' ][ 'rsi_period' ] )
             self.data[ a_robinhood_ticker + '_MACD' ], self.data[ a_robinhood_ticker + '_MACD_S' ], macd_hist = MACD( self.data[ a_robinhood_ticker ].values, fastperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_fast' ], slowperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_slow' ], signalperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_signal' ] )
 
+        # Start the price checks over from the new dataset
+        self.validator.seed( self.data )
+
+    def get_kraken_price( self, kraken_ticker ):
+        result = get_json( 'https://api.kraken.com/0/public/Ticker?pair=' + str( kraken_ticker ) ).json()
+
+        if len( result[ 'error' ] ) > 0:
+            return None
+
+        return round( float( result[ 'result' ][ kraken_ticker ][ 'a' ][ 0 ] ), 3 )
+
+    def get_robinhood_price( self, robinhood_ticker ):
+        result = rh.get_crypto_quote( robinhood_ticker )
+
+        return round( float( result[ 'mark_price' ] ), 3 )
+
+    def get_simulated_price( self, robinhood_ticker ):
+        # Used when simulate_api_calls is enabled (can be replaced, e.g. to run the bot on a given price path)
+        return round( float( randint( 400000, 500000 ) ), 3 )
+
     def get_new_data( self, now ):
         # If the current dataset has gaps in it, we refresh it from Kraken
         if self.data_has_gaps( now ) and not self.init_data():
             return False
 
         new_row = { 'timestamp': pd.Timestamp( now ) }
+        valid_tickers = []
 
-        # Calculate moving averages and RSI values
+        # Retrieve and validate the new prices: a ticker with an invalid quote is locked, the others keep trading
         for a_kraken_ticker, a_robinhood_ticker in config[ 'ticker_list' ].items():
+            price = None
+            reference_price = None
+
             if not config[ 'bot' ][ 'simulate_api_calls' ]:
-                if config[ 'bot' ][ 'data_source' ] == 'kraken':
-                    try:
-                        result = get_json( 'https://api.kraken.com/0/public/Ticker?pair=' + str( a_kraken_ticker ) ).json()
+                source = config[ 'bot' ][ 'data_source' ]
 
-                        if len( result[ 'error' ] ) == 0:
-                            new_row[ a_robinhood_ticker ] = round( float( result[ 'result' ][ a_kraken_ticker ][ 'a' ][ 0 ] ), 3 )
+                try:
+                    price = self.get_kraken_price( a_kraken_ticker ) if source == 'kraken' else self.get_robinhood_price( a_robinhood_ticker )
+                    self.api_error_counter = 0
+                except:
+                    self.log.error( 'An exception occurred retrieving prices for ' + str( a_robinhood_ticker ) + ' from ' + ( 'Kraken' if source == 'kraken' else 'Robinhood' ) + '.' )
+                    self.api_error_counter = self.api_error_counter + 1
+                    self.validator.lock( a_robinhood_ticker, 'errors' )
+                    continue
 
-                        self.api_error_counter = 0
-                    except:
-                        print( 'An exception occurred retrieving prices from Kraken.' )
-                        self.api_error_counter = self.api_error_counter + 1
-                        return False
-                else:
+                # Compare with the other source, if enabled (failures here don't block trading)
+                if config[ 'data_validation' ][ 'cross_check' ] and price is not None:
                     try:
-                        result = rh.get_crypto_quote( a_robinhood_ticker )
-                        new_row[ a_robinhood_ticker ] = round( float( result[ 'mark_price' ] ), 3 )
-                        self.api_error_counter = 0
+                        reference_price = self.get_robinhood_price( a_robinhood_ticker ) if source == 'kraken' else self.get_kraken_price( a_kraken_ticker )
                     except:
-                        print( 'An exception occurred retrieving prices from Robinhood.' )
-                        self.api_error_counter = self.api_error_counter + 1
-                        return False
+                        self.log.error( 'An exception occurred retrieving reference price for ' + str( a_robinhood_ticker ) + '.' )
             else:
-                new_row[ a_robinhood_ticker ] = round( float( randint( 400000, 500000 ) ), 3 )
+                price = self.get_simulated_price( a_robinhood_ticker )
 
-            # If the new price is more than 30% lower/higher than the previous reading, assume an error somewhere
-            percent_diff = ( abs( new_row[ a_robinhood_ticker ] - self.data.iloc[ -1 ][ a_robinhood_ticker ] ) / self.data.iloc[ -1 ][ a_robinhood_ticker ] ) * 100
-            if percent_diff > 30:
-                print( 'Error: new price ($' + str( new_row[ a_robinhood_ticker ] ) + ') differs ' + str( round( percent_diff, 2 ) ) + '% from previous value, ignoring.' )
-                return False
+            if self.validator.check( a_robinhood_ticker, price, now, reference_price = reference_price ):
+                new_row[ a_robinhood_ticker ] = price
+                valid_tickers.append( a_robinhood_ticker )
 
-            self.data = self.data.append( new_row, ignore_index = True )
+        # Nothing to add to the dataset
+        if len( valid_tickers ) == 0:
+            return False
 
-            # If the API is overloaded, it keeps returning the same value
-            if ( self.data.tail( 4 )[ a_robinhood_ticker ].to_numpy()[ -1 ] == self.data.tail( 4 )[ a_robinhood_ticker ].to_numpy() ).all():
-                print( 'Repeating values detected for ' + str( a_robinhood_ticker ) + '. Ignoring data point.' )
-                self.data = self.data[:-1]
-                return False
+        # Locked tickers carry their previous value forward, so that the indicators for the others are not interrupted
+        for a_robinhood_ticker in config[ 'ticker_list' ].values():
+            if a_robinhood_ticker not in new_row:
+                new_row[ a_robinhood_ticker ] = self.data.iloc[ -1 ][ a_robinhood_ticker ]
+
+        # Drop the oldest data points while adding the new one, so that the dataset is copied only once
+        self.data = pd.concat( [ self.data.iloc[ -max( 1, config[ 'bot' ][ 'max_data_rows' ] - 1 ): ], pd.DataFrame( [ new_row ] ) ], ignore_index = True )
 
-            elif self.data.shape[ 0 ] > 0:
-                self.data[ a_robinhood_ticker + '_SMA_F' ] = self.data[ a_robinhood_ticker ].rolling( window = config[ 'ta' ][ 'moving_average_periods' ][ 'sma_fast' ] ).mean()
-                self.data[ a_robinhood_ticker + '_SMA_S' ] = self.data[ a_robinhood_ticker ].rolling( window = config[ 'ta' ][ 'moving_average_periods' ][ 'sma_slow' ] ).mean()
-                self.data[ a_robinhood_ticker + '_EMA_F' ] = self.data[ a_robinhood_ticker ].ewm( span = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_fast' ], adjust = False, min_periods = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_fast' ]).mean()
-                self.data[ a_robinhood_ticker + '_EMA_S' ] = self.data[ a_robinhood_ticker ].ewm( span = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_slow' ], adjust = False, min_periods = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_slow' ]).mean()
-                self.data[ a_robinhood_ticker + '_RSI' ] = RSI( self.data[ a_robinhood_ticker ].values, timeperiod = config[ 'ta' ][ 'rsi_period' ] )
-                self.data[ a_robinhood_ticker + '_MACD' ], self.data[ a_robinhood_ticker + '_MACD_S' ], macd_hist = MACD( self.data[ a_robinhood_ticker ].values, fastperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_fast' ], slowperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_slow' ], signalperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_signal' ] )
+        # Calculate moving averages and RSI values
+        for a_robinhood_ticker in config[ 'ticker_list' ].values():
+            self.data[ a_robinhood_ticker + '_SMA_F' ] = self.data[ a_robinhood_ticker ].rolling( window = config[ 'ta' ][ 'moving_average_periods' ][ 'sma_fast' ] ).mean()
+            self.data[ a_robinhood_ticker + '_SMA_S' ] = self.data[ a_robinhood_ticker ].rolling( window = config[ 'ta' ][ 'moving_average_periods' ][ 'sma_slow' ] ).mean()
+            self.data[ a_robinhood_ticker + '_EMA_F' ] = self.data[ a_robinhood_ticker ].ewm( span = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_fast' ], adjust = False, min_periods = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_fast' ]).mean()
+            self.data[ a_robinhood_ticker + '_EMA_S' ] = self.data[ a_robinhood_ticker ].ewm( span = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_slow' ], adjust = False, min_periods = config[ 'ta' ][ 'moving_average_periods' ][ 'ema_slow' ]).mean()
+            self.data[ a_robinhood_ticker + '_RSI' ] = RSI( self.data[ a_robinhood_ticker ].values, timeperiod = config[ 'ta' ][ 'rsi_period' ] )
+            self.data[ a_robinhood_ticker + '_MACD' ], self.data[ a_robinhood_ticker + '_MACD_S' ], macd_hist = MACD( self.data[ a_robinhood_ticker ].values, fastperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_fast' ], slowperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_slow' ], signalperiod = config[ 'ta' ][ 'moving_average_periods' ][ 'macd_signal' ] )
 
             if config[ 'bot' ][ 'save_charts' ] == True:
                 self.save_chart( [ a_robinhood_ticker, str( a_robinhood_ticker ) + '_SMA_F', str( a_robinhood_ticker ) + '_SMA_S' ], str( a_robinhood_ticker ) + '_sma' )
@@ -484,7 +808,7 @@ class bot:
                 self.available_cash = max( 0, round( float( me[ 'crypto_buying_power' ][ 'amount' ] ) - config[ 'assets' ][ 'reserve' ], 3 ) )
                 self.api_error_counter = 0
             except:
-                print( 'An exception occurred while reading available cash amount.' )
+                self.log.error( 'An exception occurred while reading available cash amount.' )
                 self.api_error_counter = self.api_error_counter + 1
                 return False
         else:
@@ -492,40 +816,105 @@ class bot:
 
         return True
 
-    def cancel_order( self, order_id ):
+    def cancel_order( self, a_asset, reason = 'cancel' ):
+        # We don't wait for Robinhood to process the request: the outcome is checked at the next pass (see complete_cancel)
+        order_id = self.get_exchange_order_id( a_asset )
+
         if not config[ 'bot' ][ 'simulate_api_calls' ]:
             try:
                 cancelResult = rh.cancel_crypto_order( order_id )
-                self.orders[ order_id ].status = 'C'
-                print( 'Cancelled order #' + str( order_id ) + '.' )
+                a_asset.cancel_reason = reason
+                self.log.info( ( 'Repricing' if reason == 'reprice' else 'Cancelling' ) + ' order #' + str( order_id ) + '.' )
                 self.api_error_counter = 0
             except:
-                print( 'An exception occurred while attempting to cancel order #' + str( order_id ) + '.')
+                self.log.error( 'An exception occurred while attempting to cancel order #' + str( order_id ) + '.')
                 self.api_error_counter = self.api_error_counter + 1
                 return False
 
-        # Let Robinhood process this transaction
-        sleep( 10 )
+        return True
+
+    def complete_cancel( self, a_asset ):
+        reason = a_asset.cancel_reason
+        order_id = self.get_exchange_order_id( a_asset )
+
+        # Part of the order might have been filled before it was cancelled
+        try:
+            order_info = rh.get_crypto_order_info( order_id )
+            filled = a_asset.quantity if order_info[ 'state' ] == 'filled' else round( float( order_info.get( 'cumulative_quantity' ) or 0 ), 7 )
+            self.api_error_counter = 0
+        except:
+            self.log.error( 'An exception occurred while retrieving order #' + str( order_id ) + '.' )
+            self.api_error_counter = self.api_error_counter + 1
+            return False
+
+        a_asset.cancel_reason = ''
+
+        if filled >= a_asset.quantity:
+            self.confirm_order( a_asset )
+            return True
+
+        remaining = round( a_asset.quantity - filled, 7 )
+        self.log.info( 'Cancelled order #' + str( order_id ) + ( ' (' + str( filled ) + ' ' + str( a_asset.ticker ) + ' filled)' if filled > 0 else '' ) + '.' )
+
+        if a_asset.status == 'PB':
+            # Keep what we got; no profit on the rest of the order
+            self.portfolio.remove( a_asset )
+            if filled > 0:
+                a_asset.quantity = filled
+                a_asset.status = 'B'
+                self.portfolio.open( a_asset )
+            else:
+                a_asset.status = 'C'
+                a_asset.profit = 0
+
+            self.update_available_cash()
 
-        # No profit on this order
-        self.orders[ order_id ].profit = 0
+            if reason == 'reprice':
+                self.buy( a_asset.ticker, quantity = remaining, reprices = a_asset.reprices + 1 )
+        else:
+            # The coins sold are recorded as a separate asset, the rest is still ours
+            if filled > 0:
+                self.orders[ order_id ] = asset( a_asset.ticker, filled, a_asset.price, order_id, 'S' )
+                self.orders[ order_id ].status = 'S'
+                self.orders[ order_id ].timestamp = a_asset.timestamp
+                self.orders[ order_id ].limit_price = a_asset.limit_price
+                self.orders[ order_id ].profit = round( ( filled * a_asset.limit_price ) - ( filled * a_asset.price ), 3 )
+                self.orders[ order_id ].sold_at = self.clock()
+                self.portfolio.close( self.orders[ order_id ] )
+                a_asset.quantity = remaining
+                self.update_available_cash()
+
+            a_asset.status = 'B'
+            a_asset.profit = 0
+            a_asset.sell_order_id = ''
+
+            if reason == 'reprice':
+                self.sell( a_asset, reprices = a_asset.reprices + 1 )
 
         return True
 
+    def get_chart( self, label ):
+        # Figures created without pyplot are not tracked globally: we keep one per chart and clear it before drawing again
+        if label not in self.charts:
+            self.charts[ label ] = Figure( figsize = ( 15, 5 ), dpi = 300 )
+
+        self.charts[ label ].clear()
+
+        return self.charts[ label ]
+
     def save_chart( self, columns, label ):
         if len( columns ) < 1:
             return False
 
         slice = self.data.loc[:, [ 'timestamp' ] + columns ]
         # slice[ 'timestamp' ] = [ datetime.strptime( x, '%Y-%m-%d %H:%M').strftime( "%d@%H:%M" ) for x in slice[ 'timestamp' ] ]
-        fig = slice.plot( x = 'timestamp', xlabel = 'Time', ylabel = '', figsize = ( 15, 5 ), fontsize = 13, linewidth = 0.8, alpha = 0.6 )
+        fig = slice.plot( x = 'timestamp', xlabel = 'Time', ylabel = '', ax = self.get_chart( label ).add_subplot(), fontsize = 13, linewidth = 0.8, alpha = 0.6 )
         fig.set_yticks( np.arange( min( slice[ columns[ 0 ] ] ), max( slice[ columns[ 0 ] ] ), int( ( max( slice[ columns[ 0 ] ] ) - min( slice[ columns[ 0 ] ] ) ) / 20 ) ) )
         fig.yaxis.set_tick_params( labelright = 'on' )
         fig.lines[ 0 ].set_alpha( 1 )
         fig.grid( linestyle = 'dotted', linewidth = '0.5' )
         fig = fig.get_figure()
         fig.savefig( 'charts/chart_' + str( label ).lower() + '.png', dpi = 300 )
-        plt.close( fig )
 
     def save_chart_rescale( self, columns, label ):
         if len( columns ) < 1:
@@ -535,7 +924,7 @@ class bot:
         slice = self.data.loc[:, [ 'timestamp' ] + columns ]
         # slice[ 'timestamp' ] = [ datetime.strptime( x, '%Y-%m-%d %H:%M').strftime( "%d@%H:%M" ) for x in slice[ 'timestamp' ] ]
 
-        fig = plt.figure( figsize = ( 15, 5 ), dpi = 300 )
+        fig = self.get_chart( label )
         fig.subplots_adjust( right = 1 - ( len( columns ) * 0.1 ) )
         ax[ 0 ] = fig.add_subplot()
         slice[ columns[ 0 ] ].plot( x = 'timestamp', xlabel = '', ylabel = columns[ 0 ], ax=ax[ 0 ], fontsize = 13, linewidth = 0.8 )
@@ -544,18 +933,109 @@ class bot:
             ax[ idx + 1 ].spines[ 'right' ].set_position(( 'axes', 1 + idx * 0.1 ) )
             slice[ columns[ idx ] ].plot( x = 'timestamp', xlabel = '', ylabel = columns[ idx ], ax=ax[ idx + 1 ], fontsize = 13, linewidth = 0.8, color = 'C' + str( idx ) )
 
-        plt.savefig( 'charts/chart_' + str( label ).lower() + '.png' )
-        plt.close( fig )
+        fig.savefig( 'charts/chart_' + str( label ).lower() + '.png' )
+
+    def log_tick( self, now, duration ):
+        # One compact record per iteration; see status.py to display it in a human-readable format
+        latest = {}
+        if self.data.shape[ 0 ] > 0:
+            latest = { column: ( None if isinstance( value, float ) and np.isnan( value ) else value ) for column, value in zip( self.data.columns, self.data.iloc[ -1 ].tolist() ) }
+
+        record = {
+            'time': now.strftime( '%Y-%m-%d %H:%M:%S' ),
+            'duration': round( duration, 4 ),
+            'cash': self.available_cash,
+            'data': latest,
+            'assets': [ [ a_asset.order_id, a_asset.status, a_asset.ticker, a_asset.quantity, a_asset.price, a_asset.timestamp.strftime( '%Y-%m-%d %H:%M' ) ] for a_asset in self.orders.values() if a_asset.status in [ 'B', 'PB', 'PS' ] ],
+            'portfolio': self.portfolio.summary(),
+            'daily_pnl': round( self.portfolio.get_daily_pnl(), 3 ),
+            'loss_cap': self.portfolio.is_loss_cap_breached(),
+            'locked': self.validator.locked,
+            'validation': self.validator.get_counters()
+        }
+
+        if self.paper is not None:
+            record[ 'paper' ] = {
+                'cash': round( self.paper.cash, 3 ),
+                'assets': self.paper.get_assets(),
+                'portfolio': self.paper.portfolio.summary()
+            }
 
-    def handle_exit( self, signum, frame ):
+        self.logger.tick( record )
+
+        if self.snapshot is not None and not self.snapshot.publish( record ):
+            self.log.warning( 'Snapshot not published: the record is larger than ' + str( self.snapshot.capacity ) + ' bytes, increase the snapshot size in the config file' )
+
+        if config[ 'logging' ][ 'print_summary' ]:
+            self.log.info( '\n' + '\n'.join( logger.render( record ) ) )
+
+    def save_state( self ):
         with open( 'pickle/orders.pickle', 'wb' ) as f:
             pickle.dump( self.orders, f )
 
         self.data.to_pickle( 'pickle/dataframe.pickle' )
-        
-        print( 'Shutdown signal received. Saving state.' )
+
+        if self.paper is not None:
+            self.paper.save()
+
+        # Only the orders that changed since the last iteration are written to the ledger
+        try:
+            self.ledger.sync( self.orders )
+            self.ledger.set_meta( 'portfolio', json.dumps( self.portfolio.get_state() ) )
+
+            if self.data.shape[ 0 ] > 0:
+                self.ledger.update_prices( { a_robinhood_ticker: self.data.iloc[ -1 ][ a_robinhood_ticker ] for a_robinhood_ticker in config[ 'ticker_list' ].values() if a_robinhood_ticker in self.data.columns }, self.data.iloc[ -1 ][ 'timestamp' ] )
+        except Exception as e:
+            self.log.error( 'An exception occurred while updating the ledger: ' + str( e ) )
+
+    def handle_exit( self, signum, frame ):
+        self.save_state()
+
+        if self.session is not None:
+            self.session.close()
+
+        self.log.info( 'Shutdown signal received. Saving state.' )
         exit()
 
+def install( session ):
+    # Route the calls to Kraken and Robinhood (and the simulated values) through a session, to record or replay them (see playback.py)
+    global get_json, rh, randint, sleep
+
+    get_json = session.wrap( 'get_json', get_json, convert = response.from_requests )
+    rh = session.wrap_module( 'rh', rh, private = [ 'login' ] )
+    randint = session.wrap( 'randint', randint )
+    sleep = session.sleep
+
+def record_session( filename ):
+    # The settings (without credentials) and the saved state are stored at the beginning of the recording, to start the replay from the same point
+    settings = copy.deepcopy( config )
+    if 'bot' in settings:
+        settings[ 'bot' ].update( { 'username': '', 'password': '', 'totp': '' } )
+
+    files = {}
+    for a_file in [ 'pickle/orders.pickle', 'pickle/dataframe.pickle', 'pickle/paper.pickle', 'pickle/ledger.sqlite' ]:
+        if path.exists( a_file ):
+            with open( a_file, 'rb' ) as f:
+                files[ a_file ] = f.read()
+
+    session = recording( filename, 'w', { 'config': settings, 'files': files, 'started': datetime.now() } )
+    install( session )
+
+    return session
+
 if __name__ == "__main__":
+    # Record all the inputs of this session, if enabled
+    session = None
+    recording_settings = config.get( 'recording' ) or bot.default_config[ 'recording' ]
+    if recording_settings[ 'enabled' ]:
+        if not path.exists( recording_settings[ 'folder' ] ):
+            makedirs( recording_settings[ 'folder' ] )
+
+        session = record_session( path.join( recording_settings[ 'folder' ], 'session-' + datetime.now().strftime( '%Y%m%d-%H%M%S' ) + '.rec.gz' ) )
+
     b = bot()
-    b.run()
+
+    if session is not None:
+        b.attach( session )
+
+    b.loop()
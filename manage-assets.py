@@ -1,29 +1,105 @@
 #!/usr/bin/python3 -u
 
 # Crypto Trading Bot - Add or remove assets from the bot's portfolio
-# Version: 1.0
+# Version: 1.1
 
 from classes.asset import asset
-from os import path
-import pandas as pd
+from classes.ledger import ledger
+from classes.snapshot import snapshot
+from datetime import datetime
+from os import path, makedirs
 import pickle
 import sys
 
-orders = {}
-data = pd.DataFrame()
+syntax = 'Syntax: manage-asset.py buy ticker quantity price | sell asset_id sale_price | update_status order_id status | list [status] [from] [to] | csv | parquet | profit [ticker] [from] [to] | stats'
 
-# Load assets and data
-if path.exists( 'pickle/orders.pickle' ):
-    with open( 'pickle/orders.pickle', 'rb' ) as f:
-        orders = pickle.load( f )
+if len( sys.argv ) <= 1:
+    print( syntax )
+    exit()
+
+if not path.exists( 'pickle' ):
+    makedirs( 'pickle' )
+
+# Reports are answered by the indexed ledger; the full order log is only unpickled to change it (or to build the ledger the first time)
+orders_ledger = ledger( 'pickle/ledger.sqlite' )
+
+def load_orders():
+    orders = {}
+
+    if path.exists( 'pickle/orders.pickle' ):
+        with open( 'pickle/orders.pickle', 'rb' ) as f:
+            orders = pickle.load( f )
+
+    return orders
+
+def save_orders( orders ):
+    with open( 'pickle/orders.pickle', 'wb' ) as f:
+        pickle.dump( orders, f )
+
+def get_arg( position ):
+    # Use '-' to skip an optional positional argument
+    if len( sys.argv ) > position and sys.argv[ position ] != '-':
+        return sys.argv[ position ]
+
+    return None
+
+def get_prices():
+    # Latest prices published by the running bot, if available; otherwise the last ones saved in the ledger
+    try:
+        reader = snapshot( snapshot.default_filename() )
+        latest = reader.read()
+        reader.close()
+    except ( OSError, ValueError, TimeoutError ):
+        latest = None
+
+    if latest is not None:
+        prices = { ticker: price for ticker, price in latest[ 2 ].get( 'data', {} ).items() if ticker != 'timestamp' and '_' not in ticker and isinstance( price, float ) }
+        if len( prices ) > 0:
+            return prices
+
+    return orders_ledger.get_prices()
+
+def current_value( a_order, prices ):
+    if a_order[ 'ticker' ] in prices:
+        return round( prices[ a_order[ 'ticker' ] ] * a_order[ 'quantity' ], 3 )
+
+    return 'N/A'
+
+def export_row( a_order, prices ):
+    row = [
+        a_order[ 'timestamp' ][ :16 ],
+        str( a_order[ 'order_id' ] ),
+        str( a_order[ 'status' ] ),
+        str( a_order[ 'ticker' ] ),
+        str( a_order[ 'quantity' ] ),
+        str( a_order[ 'price' ] ),
+        str( round( a_order[ 'price' ] * a_order[ 'quantity' ], 3 ) )
+    ]
+
+    if a_order[ 'status' ] in [ 'PB', 'B' ]:
+        row.extend( [ str( current_value( a_order, prices ) ), 0 ] )
+    elif a_order[ 'status' ] in [ 'PS', 'S' ]:
+        row.extend( [ 0, str( a_order[ 'profit' ] ) ] )
+    else:
+        row.extend( [ 0, 0 ] )
+
+    return row
 
-if path.exists( 'pickle/dataframe.pickle' ):
-    data = pd.read_pickle( 'pickle/dataframe.pickle' )
+export_header = [ 'Date and Time', 'Order ID', 'Status', 'Ticker', 'Quantity', 'Price', 'Cost', 'Current Value', 'Estimated Profit' ]
+
+if orders_ledger.is_empty() and path.exists( 'pickle/orders.pickle' ):
+    print( 'Building the ledger from the saved orders' )
+    orders_ledger.sync( load_orders() )
+
+if sys.argv[ 1 ] in [ 'buy', 'sell', 'update_status' ]:
+    orders = load_orders()
 
-if len( sys.argv ) > 1:
     if sys.argv[ 1 ] == 'buy':
         try:
-            orders[ str( len( orders ) ) ] = asset( sys.argv[ 2 ], sys.argv[ 3 ], sys.argv[ 4 ], str( len( orders ) ) )
+            order_id = str( len( orders ) )
+            while order_id in orders or orders_ledger.has_order( order_id ):
+                order_id = str( int( order_id ) + 1 )
+            orders[ order_id ] = asset( sys.argv[ 2 ], sys.argv[ 3 ], sys.argv[ 4 ], order_id )
         except:
             print( 'Syntax: manage-asset.py buy ticker quantity price' )
             exit()
@@ -31,6 +107,7 @@ if len( sys.argv ) > 1:
     elif sys.argv[ 1 ] == 'sell':
         try:
             orders[ sys.argv[ 2 ] ].status = 'S'
+            orders[ sys.argv[ 2 ] ].sold_at = datetime.now()
         except:
             print( 'Error: asset not found' )
             exit()
@@ -52,62 +129,98 @@ if len( sys.argv ) > 1:
             print( 'Error: asset not found' )
             exit()
 
-    elif sys.argv[ 1 ] == 'csv':
-        import csv
-        with open( 'orders.csv', 'w', encoding='utf8' ) as csv_file:
-            writer = csv.writer( csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL )
-            writer.writerow( [ 'Date and Time', 'Order ID', 'Status', 'Ticker', 'Quantity', 'Price', 'Cost', 'Current Value', 'Estimated Profit' ] )
-            for a_asset in orders.values():
-                row = [
-                    a_asset.timestamp.strftime( '%Y-%m-%d %H:%M' ),
-                    str( a_asset.order_id ),
-                    str( a_asset.status ),
-                    str( a_asset.ticker ),
-                    str( a_asset.quantity ),
-                    str( a_asset.price ),
-                    str( round( a_asset.price * a_asset.quantity, 3 ) )
-                ]
-
-                if a_asset.status in [ 'PB', 'B' ]:
-                    row.extend( [ str( round( data.iloc[ -1 ][ a_asset.ticker ] * a_asset.quantity, 3 ) ), 0 ] )
-                elif a_asset.status in [ 'PS', 'S' ]:
-                   row.extend( [ 0, str( a_asset.profit ) ] )
-                else:
-                    row.extend( [ 0, 0 ] )
-
-                writer.writerow( row )
-
-    # List all orders in the log
-    if len( orders ) > 0:
-        profit = 0
-        for count, i in enumerate( orders ):
-            if sys.argv[ 1 ] == 'profit':
-                profit += orders[ i ].profit
-            elif len( sys.argv ) <= 2 or sys.argv[ 1 ] != 'list' or ( len( sys.argv ) > 2 and sys.argv[ 2 ] == orders[ i ].status ):
-                print( "\n-- {:05d} -------------------------------".format( count + 1 ) )
-                print( "Date and time: {}\nID: {}\nStatus: {}\nTicker: {}\nQuantity: {}\nPrice: $ {}\nCost: $ {}".format(
-                    orders[ i ].timestamp.strftime( '%Y-%m-%d %H:%M' ),
-                    str( orders[ i ].order_id ),
-                    str( orders[ i ].status ),
-                    str( orders[ i ].ticker ),
-                    str( orders[ i ].quantity ),
-                    str( orders[ i ].price ),
-                    str( round( orders[ i ].price * orders[ i ].quantity, 3 ) )
-                ) )
-
-                if orders[ i ].status in [ 'PB', 'B' ]:
-                    print( 'Current Value: $ ' + str( round( data.iloc[ -1 ][ orders[ i ].ticker ] * orders[ i ].quantity, 3 ) ) )
-                elif orders[ i ].status in [ 'PS', 'S' ]:
-                    print( 'Estimated Profit: $ ' + str( orders[ i ].profit ) )
-
-        if sys.argv[ 1 ] == 'profit':
-            print( 'Profit: $' + str( profit ) )
-    else:
+    save_orders( orders )
+    orders_ledger.sync( orders )
+
+# Append the orders that changed since the previous export; the most recent row for each order ID is the current one
+elif sys.argv[ 1 ] == 'csv':
+    import csv
+
+    last_seq = int( orders_ledger.get_meta( 'csv_seq', 0 ) )
+    is_new_file = not path.exists( 'orders.csv' ) or last_seq == 0
+    prices = get_prices()
+    count = 0
+
+    with open( 'orders.csv', 'w' if is_new_file else 'a', encoding='utf8' ) as csv_file:
+        writer = csv.writer( csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL )
+        if is_new_file:
+            writer.writerow( export_header )
+            last_seq = 0
+
+        for a_order in orders_ledger.get_orders( after_seq = last_seq ):
+            writer.writerow( export_row( a_order, prices ) )
+            last_seq = a_order[ 'seq' ]
+            count += 1
+
+    orders_ledger.set_meta( 'csv_seq', last_seq )
+    print( 'Exported ' + str( count ) + ' orders to orders.csv' )
+
+# Same as csv, but each export is written as a new Parquet part file
+elif sys.argv[ 1 ] == 'parquet':
+    try:
+        import pandas as pd
+        import pyarrow
+    except ImportError:
+        print( 'Error: Parquet export requires pandas and pyarrow (pip3 install pyarrow)' )
+        exit()
+
+    if not path.exists( 'orders-parquet' ):
+        makedirs( 'orders-parquet' )
+
+    last_seq = int( orders_ledger.get_meta( 'parquet_seq', 0 ) )
+    prices = get_prices()
+    rows = [ export_row( a_order, prices ) + [ a_order[ 'seq' ] ] for a_order in orders_ledger.get_orders( after_seq = last_seq ) ]
+
+    if len( rows ) > 0:
+        part = pd.DataFrame( rows, columns = export_header + [ 'Sequence' ] ).astype( str )
+        part.to_parquet( 'orders-parquet/part-{:012d}-{:012d}.parquet'.format( last_seq + 1, rows[ -1 ][ -1 ] ), index = False )
+        orders_ledger.set_meta( 'parquet_seq', rows[ -1 ][ -1 ] )
+
+    print( 'Exported ' + str( len( rows ) ) + ' orders to orders-parquet/' )
+
+elif sys.argv[ 1 ] == 'profit':
+    print( 'Profit: $' + str( orders_ledger.get_profit( get_arg( 2 ), get_arg( 3 ), get_arg( 4 ) ) ) )
+
+elif sys.argv[ 1 ] == 'stats':
+    print( '-- Orders by Status ---------------------' )
+    for status, count in orders_ledger.get_status_counts().items():
+        print( "{:<6}  {}".format( status, count ) )
+
+    print( '-- Profit by Ticker ---------------------' )
+    for ticker, profit in orders_ledger.get_profit_by_ticker().items():
+        print( "{:<6}  $ {}".format( ticker, profit ) )
+
+    print( '-- Profit by Day ------------------------' )
+    for day, profit in orders_ledger.get_profit_by_day( get_arg( 2 ), get_arg( 3 ) ).items():
+        print( "{:<10}  $ {}".format( day, profit ) )
+
+# List all orders in the log, optionally filtered by status and date range
+elif sys.argv[ 1 ] == 'list':
+    prices = get_prices()
+    count = 0
+
+    for a_order in orders_ledger.get_orders( get_arg( 2 ), get_arg( 3 ), get_arg( 4 ) ):
+        count += 1
+        print( "\n-- {:05d} -------------------------------".format( count ) )
+        print( "Date and time: {}\nID: {}\nStatus: {}\nTicker: {}\nQuantity: {}\nPrice: $ {}\nCost: $ {}".format(
+            a_order[ 'timestamp' ][ :16 ],
+            str( a_order[ 'order_id' ] ),
+            str( a_order[ 'status' ] ),
+            str( a_order[ 'ticker' ] ),
+            str( a_order[ 'quantity' ] ),
+            str( a_order[ 'price' ] ),
+            str( round( a_order[ 'price' ] * a_order[ 'quantity' ], 3 ) )
+        ) )
+
+        if a_order[ 'status' ] in [ 'PB', 'B' ]:
+            print( 'Current Value: $ ' + str( current_value( a_order, prices ) ) )
+        elif a_order[ 'status' ] in [ 'PS', 'S' ]:
+            print( 'Estimated Profit: $ ' + str( a_order[ 'profit' ] ) )
+
+    if count == 0:
         print( 'No orders found.' )
 
 else:
-    print( 'Syntax: manage-asset.py buy ticker quantity price | sell asset_id sale_price | update_status order_id status | list | csv | profit' )
-    exit()
+    print( syntax )
 
-with open( 'pickle/orders.pickle', 'wb' ) as f:
-    pickle.dump( orders, f )
+orders_ledger.close()
@@ -0,0 +1,140 @@
+#!/usr/bin/python3 -u
+
+# Crypto Trading Bot - Replay a recorded session at full speed, to profile it or to compare the decisions taken by different versions of the code
+# Version: 1.0
+
+import argparse
+import cProfile
+import json
+from os import chdir, makedirs, path
+import pstats
+import runpy
+import sys
+import tempfile
+from time import perf_counter
+import types
+
+root = path.dirname( path.abspath( __file__ ) )
+sys.path.insert( 0, root )
+
+# The recorded settings are used by default, so the sample config is enough if you haven't created yours yet
+if not path.exists( path.join( root, 'config.py' ) ):
+    sys.modules[ 'config' ] = types.ModuleType( 'config' )
+    sys.modules[ 'config' ].config = runpy.run_path( path.join( root, 'config-sample.py' ) )[ 'config' ]
+
+from config import config
+from classes.recording import recording
+import core
+
+# Robinhood calls that place or cancel orders
+order_calls = [ 'rh.order_buy_crypto_limit', 'rh.order_sell_crypto_limit', 'rh.cancel_crypto_order' ]
+
+parser = argparse.ArgumentParser( description = 'Replay a session recorded by the bot (see the recording section of the config file)' )
+parser.add_argument( 'filename', help = 'recorded session (sessions/session-*.rec.gz)' )
+parser.add_argument( '--folder', help = 'where to store the files created by the bot during the replay (default: a new temporary folder)' )
+parser.add_argument( '--current-config', action = 'store_true', help = 'use the settings in config.py instead of the ones recorded with the session' )
+parser.add_argument( '--decisions', help = 'save the assets held after each iteration, and the orders placed, to this file (one JSON record per line), to compare two replays' )
+parser.add_argument( '--profile', action = 'store_true', help = 'run the replay under cProfile and list the functions that took the most time' )
+
+def get_state( b, name, now, orders ):
+    # Assets held (or pending) after each pass, in the same format as the tick log
+    record = {
+        'pass': name,
+        'time': str( now ),
+        'orders': orders,
+        'assets': [ [ a_asset.order_id, a_asset.status, a_asset.ticker, a_asset.quantity, a_asset.price ] for a_asset in b.orders.values() if a_asset.status in [ 'B', 'PB', 'PS' ] ]
+    }
+
+    if b.paper is not None:
+        record[ 'paper' ] = [ [ a_asset.order_id, a_asset.status, a_asset.ticker, a_asset.quantity, a_asset.price ] for a_asset in b.paper.orders.values() if a_asset.status in [ 'B', 'PB', 'PS' ] ]
+
+    return record
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    filename = path.abspath( args.filename )
+
+    try:
+        session = recording( filename, 'r' )
+    except ( OSError, ValueError ) as e:
+        print( 'Error: could not open ' + args.filename + ': ' + str( e ) )
+        exit()
+
+    # Start from the same settings and state as the recorded session
+    if not args.current_config:
+        config.clear()
+        config.update( session.header[ 'config' ] )
+
+    # Credentials are not recorded (the login itself is not replayed), and the live bot's snapshot must not be overwritten
+    config[ 'bot' ][ 'totp' ] = config[ 'bot' ].get( 'totp' ) or 'AAAAAAAAAAAAAAAA'
+    config[ 'snapshot' ] = { 'enabled': False, 'filename': '', 'size': 0 }
+    config[ 'recording' ] = { 'enabled': False, 'folder': 'sessions' }
+    if 'logging' in config:
+        config[ 'logging' ][ 'console' ] = False
+
+    decisions_filename = path.abspath( args.decisions ) if args.decisions else None
+    folder = args.folder if args.folder else tempfile.mkdtemp( prefix = 'playback-' )
+    makedirs( folder, exist_ok = True )
+    chdir( folder )
+    makedirs( 'pickle', exist_ok = True )
+    for a_file, content in session.header[ 'files' ].items():
+        with open( a_file, 'wb' ) as f:
+            f.write( content )
+
+    print( 'Replaying the session started on ' + str( session.header[ 'started' ] ) + ' in ' + folder )
+
+    core.install( session )
+    b = core.bot()
+    b.attach( session )
+
+    decisions = open( decisions_filename, 'w', encoding = 'utf8' ) if decisions_filename else None
+    replayed_orders = []
+    recorded_orders = []
+    passes = 0
+    profiler = cProfile.Profile() if args.profile else None
+    started = perf_counter()
+
+    try:
+        for name in session.passes():
+            recorded_orders.extend( [ x[ 1 ], x[ 2 ] ] for x in session.events if x[ 0 ] == 'call' and x[ 1 ] in order_calls )
+            not_recorded = dict( session.not_recorded )
+
+            if profiler is not None:
+                profiler.enable()
+
+            getattr( b, name )()
+
+            if profiler is not None:
+                profiler.disable()
+
+            passes += 1
+
+            # Orders placed when replaying this pass: the recorded ones that were matched, plus the ones the recording doesn't have
+            orders = [ [ x[ 1 ], list( x[ 2 ] ) ] for i, x in enumerate( session.events ) if session.used[ i ] and x[ 1 ] in order_calls ]
+            orders.extend( [ [ x, 'not recorded' ] for x in order_calls if session.not_recorded.get( x, 0 ) > not_recorded.get( x, 0 ) ] )
+            replayed_orders.extend( orders )
+
+            if decisions is not None:
+                decisions.write( json.dumps( get_state( b, name, session.last_results.get( 'clock' ), orders ), default = str ) + '\n' )
+    except SystemExit:
+        print( 'The bot stopped during the replay (see ' + path.join( folder, 'logs', 'status.log' ) + ')' )
+
+    elapsed = perf_counter() - started
+
+    if decisions is not None:
+        decisions.close()
+
+    print( '-- Replay -------------------------------' )
+    print( 'Passes: ' + str( passes ) + ' (' + str( session.event_count ) + ' recorded calls) in ' + str( round( elapsed, 3 ) ) + ' seconds' )
+    print( 'Orders placed or cancelled: ' + str( len( recorded_orders ) ) + ' recorded, ' + str( len( replayed_orders ) ) + ' replayed' )
+
+    if len( session.not_recorded ) > 0:
+        print( 'Calls not found in the recording (the code took a different path):' )
+        for name, count in sorted( session.not_recorded.items() ):
+            print( "  {:<40}  {}".format( name, count ) )
+
+    if profiler is not None:
+        print( '-- Profile ------------------------------' )
+        pstats.Stats( profiler ).sort_stats( 'cumulative' ).print_stats( 25 )
+
+    session.close()
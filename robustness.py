@@ -0,0 +1,203 @@
+#!/usr/bin/python3 -u
+
+# Crypto Trading Bot - Walk-forward and Monte Carlo robustness tests for trade_signals configurations
+# Version: 1.0
+
+from config import config
+from classes.registry import registry
+from classes.replay import replay
+from classes.signals import signals
+
+import argparse
+import copy
+import csv
+from multiprocessing import Pool, cpu_count, shared_memory
+import numpy as np
+import pandas as pd
+import runpy
+
+# Data shared with the worker processes: the price matrix and timestamps live in shared memory, so they are not copied for each replay
+worker = {}
+
+def init_worker( prices_name, timestamps_name, shape, tickers, configurations, options ):
+    worker[ 'prices_memory' ] = shared_memory.SharedMemory( name = prices_name )
+    worker[ 'timestamps_memory' ] = shared_memory.SharedMemory( name = timestamps_name )
+    worker[ 'prices' ] = np.ndarray( shape, dtype = np.float64, buffer = worker[ 'prices_memory' ].buf )
+    worker[ 'timestamps' ] = np.ndarray( ( shape[ 0 ], ), dtype = np.int64, buffer = worker[ 'timestamps_memory' ].buf )
+    worker[ 'tickers' ] = tickers
+    worker[ 'configurations' ] = configurations
+    worker[ 'options' ] = options
+    worker[ 'replay' ] = replay( config[ 'ta' ], config[ 'assets' ], options[ 'slippage' ] )
+    worker[ 'data' ] = {}
+    worker[ 'registries' ] = {}
+
+def get_registry( configuration_index, ticker ):
+    # Signal functions read their params from the global config, so each task selects its own configuration
+    config[ 'trade_signals' ] = worker[ 'configurations' ][ configuration_index ][ 'trade_signals' ]
+
+    # Built once per configuration and ticker in each worker, so the expression signals are not compiled again for every task
+    if ( configuration_index, ticker ) not in worker[ 'registries' ]:
+        worker[ 'registries' ][ ( configuration_index, ticker ) ] = registry( signals(), config[ 'trade_signals' ], [ ticker ] )
+
+    return worker[ 'registries' ][ ( configuration_index, ticker ) ]
+
+def run_task( task ):
+    kind, configuration_index, ticker_index, start, end, seed = task
+    ticker = worker[ 'tickers' ][ ticker_index ]
+    a_registry = get_registry( configuration_index, ticker )
+
+    if kind == 'monte_carlo':
+        prices = worker[ 'replay' ].bootstrap( worker[ 'prices' ][ :, ticker_index ], worker[ 'options' ][ 'block_size' ], np.random.default_rng( seed ) )
+        data = worker[ 'replay' ].build( worker[ 'timestamps' ], prices, ticker )
+    else:
+        # Indicators on the historical series are computed once per worker
+        if ticker not in worker[ 'data' ]:
+            worker[ 'data' ][ ticker ] = worker[ 'replay' ].build( worker[ 'timestamps' ], worker[ 'prices' ][ :, ticker_index ], ticker )
+        data = worker[ 'data' ][ ticker ]
+
+    result = worker[ 'replay' ].run( data, ticker, a_registry, start, end, worker[ 'options' ][ 'cash' ] )
+    result.update( { 'kind': kind, 'configuration': configuration_index, 'ticker': ticker, 'start': start, 'end': end, 'seed': seed } )
+
+    return result
+
+def load_data( filename, tickers ):
+    if filename.endswith( '.csv' ):
+        data = pd.read_csv( filename, parse_dates = [ 'timestamp' ] )
+    else:
+        data = pd.read_pickle( filename )
+
+    tickers = [ x for x in tickers if x in data.columns ]
+    if len( tickers ) == 0:
+        print( 'Error: none of the tickers in ticker_list were found in ' + filename )
+        exit()
+
+    data = data[ [ 'timestamp' ] + tickers ].copy()
+    data[ tickers ] = data[ tickers ].astype( float ).ffill().bfill()
+
+    return data, tickers
+
+def percentiles( values ):
+    if len( values ) == 0:
+        return [ 'N/A' ] * 3
+
+    return [ round( float( x ), 3 ) for x in np.percentile( values, [ 5, 50, 95 ] ) ]
+
+parser = argparse.ArgumentParser( description = 'Walk-forward and Monte Carlo robustness tests for trade_signals configurations' )
+parser.add_argument( '--data', default = 'pickle/dataframe.pickle', help = 'price history (pickle or CSV with a timestamp column and one column per Robinhood ticker)' )
+parser.add_argument( '--grid', help = 'Python file defining a list called configurations: [ { \'name\': ..., \'trade_signals\': { ... } }, ... ]' )
+parser.add_argument( '--train', type = int, default = 1000, help = 'walk-forward training window (data points)' )
+parser.add_argument( '--test', type = int, default = 250, help = 'walk-forward test window (data points)' )
+parser.add_argument( '--step', type = int, default = 0, help = 'how far to roll the windows at each fold (default: test window)' )
+parser.add_argument( '--replays', type = int, default = 1000, help = 'number of Monte Carlo replays per configuration and ticker' )
+parser.add_argument( '--block', type = int, default = 48, help = 'block size for the bootstrap of returns (data points)' )
+parser.add_argument( '--cash', type = float, default = 1000.0, help = 'initial cash for each replay' )
+parser.add_argument( '--slippage', type = float, default = 0.001, help = 'fill price penalty, as a fraction of the price' )
+parser.add_argument( '--processes', type = int, default = cpu_count(), help = 'number of worker processes' )
+parser.add_argument( '--seed', type = int, default = 0, help = 'random seed for the Monte Carlo replays' )
+parser.add_argument( '--output', help = 'save the result of every replay to this CSV file' )
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.grid:
+        configurations = runpy.run_path( args.grid )[ 'configurations' ]
+    else:
+        configurations = [ { 'name': 'config', 'trade_signals': copy.deepcopy( config[ 'trade_signals' ] ) } ]
+
+    # Catch invalid configurations before spawning the workers
+    for a_configuration in configurations:
+        try:
+            config[ 'trade_signals' ] = a_configuration[ 'trade_signals' ]
+            registry( signals(), a_configuration[ 'trade_signals' ], [] )
+        except ValueError as e:
+            print( 'Error in configuration ' + str( a_configuration.get( 'name' ) ) + ': ' + str( e ) )
+            exit()
+
+    data, tickers = load_data( args.data, list( config[ 'ticker_list' ].values() ) )
+    points = data.shape[ 0 ]
+    step = args.step if args.step > 0 else args.test
+
+    folds = [ ( x, x + args.train, x + args.train + args.test ) for x in range( 0, points - args.train - args.test + 1, step ) ]
+    print( 'Loaded ' + str( points ) + ' data points for ' + ', '.join( tickers ) + '; ' + str( len( configurations ) ) + ' configurations, ' + str( len( folds ) ) + ' walk-forward folds, ' + str( args.replays ) + ' Monte Carlo replays' )
+
+    prices = data[ tickers ].to_numpy( dtype = np.float64 )
+    timestamps = data[ 'timestamp' ].to_numpy( dtype = 'datetime64[ns]' ).astype( np.int64 )
+
+    prices_memory = shared_memory.SharedMemory( create = True, size = prices.nbytes )
+    timestamps_memory = shared_memory.SharedMemory( create = True, size = timestamps.nbytes )
+
+    try:
+        np.ndarray( prices.shape, dtype = np.float64, buffer = prices_memory.buf )[:] = prices
+        np.ndarray( timestamps.shape, dtype = np.int64, buffer = timestamps_memory.buf )[:] = timestamps
+
+        options = { 'slippage': args.slippage, 'block_size': args.block, 'cash': args.cash }
+        results = []
+
+        with Pool( args.processes, initializer = init_worker, initargs = ( prices_memory.name, timestamps_memory.name, prices.shape, tickers, configurations, options ) ) as pool:
+            # Walk-forward: evaluate every configuration on each training and test window
+            tasks = []
+            for fold_index, ( train_start, test_start, test_end ) in enumerate( folds ):
+                for configuration_index in range( len( configurations ) ):
+                    for ticker_index in range( len( tickers ) ):
+                        tasks.append( ( 'train', configuration_index, ticker_index, train_start, test_start, fold_index ) )
+                        tasks.append( ( 'test', configuration_index, ticker_index, test_start, test_end, fold_index ) )
+
+            # Monte Carlo: replay each configuration on resampled price paths (the same paths for all configurations)
+            for configuration_index in range( len( configurations ) ):
+                for ticker_index in range( len( tickers ) ):
+                    for replay_index in range( args.replays ):
+                        tasks.append( ( 'monte_carlo', configuration_index, ticker_index, 0, None, args.seed + replay_index * len( tickers ) + ticker_index ) )
+
+            for count, a_result in enumerate( pool.imap_unordered( run_task, tasks, chunksize = max( 1, len( tasks ) // ( args.processes * 20 ) ) ) ):
+                results.append( a_result )
+                if ( count + 1 ) % 1000 == 0:
+                    print( 'Completed ' + str( count + 1 ) + ' of ' + str( len( tasks ) ) + ' replays' )
+    finally:
+        prices_memory.close()
+        prices_memory.unlink()
+        timestamps_memory.close()
+        timestamps_memory.unlink()
+
+    # Profit of each configuration on each window, summed across tickers
+    window_profit = {}
+    for a_result in results:
+        if a_result[ 'kind' ] in [ 'train', 'test' ]:
+            key = ( a_result[ 'kind' ], a_result[ 'seed' ], a_result[ 'configuration' ] )
+            window_profit[ key ] = window_profit.get( key, 0.0 ) + a_result[ 'profit' ]
+
+    # Walk-forward selection: pick the configuration with the best training profit, and record its profit on the following test window
+    print( '-- Walk-Forward -------------------------' )
+    print( "{:<6}  {:<24}  {:<12}  {:<12}".format( 'Fold', 'Selected', 'Train', 'Test' ) )
+    selected_profit = []
+    for fold_index in range( len( folds ) ):
+        train = [ window_profit.get( ( 'train', fold_index, c ), 0.0 ) for c in range( len( configurations ) ) ]
+        best = int( np.argmax( train ) )
+        test = window_profit.get( ( 'test', fold_index, best ), 0.0 )
+        selected_profit.append( test )
+        print( "{:<6}  {:<24}  {:<12}  {:<12}".format( fold_index + 1, str( configurations[ best ].get( 'name', best ) ), str( round( train[ best ], 3 ) ), str( round( test, 3 ) ) ) )
+
+    if len( folds ) > 0:
+        print( 'Out-of-sample profit of the walk-forward selection: $' + str( round( sum( selected_profit ), 3 ) ) )
+    else:
+        print( 'Not enough data points for a single fold (train + test = ' + str( args.train + args.test ) + ')' )
+
+    # Distributions per configuration (5th, 50th and 95th percentile)
+    print( '-- Distributions (p5 / p50 / p95) -------' )
+    print( "{:<24}  {:<30}  {:<30}  {:<24}".format( 'Configuration', 'Walk-forward test profit', 'Monte Carlo profit', 'Monte Carlo max drawdown' ) )
+    for configuration_index, a_configuration in enumerate( configurations ):
+        test = [ window_profit[ ( 'test', x, configuration_index ) ] for x in range( len( folds ) ) ]
+        monte_carlo = [ x for x in results if x[ 'kind' ] == 'monte_carlo' and x[ 'configuration' ] == configuration_index ]
+        print( "{:<24}  {:<30}  {:<30}  {:<24}".format(
+            str( a_configuration.get( 'name', configuration_index ) ),
+            ' / '.join( str( x ) for x in percentiles( test ) ),
+            ' / '.join( str( x ) for x in percentiles( [ x[ 'profit' ] for x in monte_carlo ] ) ),
+            ' / '.join( str( x ) for x in percentiles( [ x[ 'max_drawdown' ] for x in monte_carlo ] ) )
+        ) )
+
+    if args.output:
+        with open( args.output, 'w', encoding = 'utf8' ) as csv_file:
+            writer = csv.writer( csv_file, delimiter = ',', quotechar = '"', quoting = csv.QUOTE_MINIMAL )
+            writer.writerow( [ 'Kind', 'Configuration', 'Ticker', 'Start', 'End', 'Fold/Seed', 'Profit', 'Max Drawdown', 'Trades' ] )
+            for a_result in results:
+                writer.writerow( [ a_result[ 'kind' ], configurations[ a_result[ 'configuration' ] ].get( 'name', a_result[ 'configuration' ] ), a_result[ 'ticker' ], a_result[ 'start' ], a_result[ 'end' ], a_result[ 'seed' ], a_result[ 'profit' ], a_result[ 'max_drawdown' ], a_result[ 'trades' ] ] )
+        print( 'Results saved to ' + args.output )
@@ -0,0 +1,151 @@
+#!/usr/bin/python3 -u
+
+# Crypto Trading Bot - Soak test: runs the bot on simulated prices and time, and checks that its memory usage stays flat
+# Version: 1.0
+
+import argparse
+import copy
+from datetime import datetime, timedelta
+import gc
+import numpy as np
+from os import chdir, makedirs, path
+import pickle
+import pandas as pd
+import runpy
+import sys
+import tempfile
+import types
+
+root = path.dirname( path.abspath( __file__ ) )
+sys.path.insert( 0, root )
+
+# The settings that matter are overridden below, so the sample config is enough if you haven't created yours yet
+if not path.exists( path.join( root, 'config.py' ) ):
+    sys.modules[ 'config' ] = types.ModuleType( 'config' )
+    sys.modules[ 'config' ].config = runpy.run_path( path.join( root, 'config-sample.py' ) )[ 'config' ]
+
+# Same for the signals: the soak test defines its own
+if not path.exists( path.join( root, 'classes', 'signals.py' ) ):
+    sys.modules[ 'classes.signals' ] = types.ModuleType( 'classes.signals' )
+    sys.modules[ 'classes.signals' ].signals = runpy.run_path( path.join( root, 'classes', 'signals-sample.py' ) )[ 'signals' ]
+
+from config import config
+from core import bot
+from classes.replay import replay
+
+parser = argparse.ArgumentParser( description = 'Run the bot on simulated prices and time, and check that its memory usage stays flat' )
+parser.add_argument( '--ticks', type = int, default = 100000, help = 'number of iterations to run' )
+parser.add_argument( '--warmup', type = int, default = 5000, help = 'iterations to run before measuring the baseline' )
+parser.add_argument( '--report-every', type = int, default = 10000, help = 'iterations between two reports' )
+parser.add_argument( '--tolerance', type = float, default = 10.0, help = 'maximum memory growth after the warm-up (MB)' )
+parser.add_argument( '--max-closed-orders', type = int, default = 20, help = 'closed orders kept in memory (the older ones are archived)' )
+parser.add_argument( '--period', type = int, default = 96, help = 'iterations per price cycle' )
+parser.add_argument( '--amplitude', type = float, default = 0.03, help = 'price swing around the average, as a percentage (3%%)' )
+parser.add_argument( '--charts', action = 'store_true', help = 'also save the charts at each iteration (much slower)' )
+parser.add_argument( '--folder', help = 'where to store the files created by the bot (default: a new temporary folder)' )
+
+def count_archived( filename ):
+    count = 0
+
+    if path.exists( filename ):
+        with open( filename, 'rb' ) as f:
+            while True:
+                try:
+                    pickle.load( f )
+                    count += 1
+                except EOFError:
+                    break
+
+    return count
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for c in bot.default_config:
+        if not config.get( c ):
+            config[ c ] = copy.deepcopy( bot.default_config[ c ] )
+
+    # No calls to Robinhood or Kraken; paper trading exercises the order log
+    config[ 'bot' ].update( { 'simulate_api_calls': True, 'trades_enabled': False, 'save_charts': args.charts } )
+    config[ 'paper_trading' ].update( { 'enabled': True, 'fill_delay_seconds': 0 } )
+    config[ 'logging' ].update( { 'console': False, 'print_summary': False } )
+    config[ 'snapshot' ][ 'filename' ] = 'pickle/snapshot.mmap'
+    config[ 'memory' ].update( { 'tracemalloc': True, 'report_every': args.report_every, 'max_closed_orders': args.max_closed_orders } )
+
+    # Buy on dips below the slow moving average, sell at a small profit: on the price path below, positions keep being opened and closed
+    config[ 'trade_signals' ] = {
+        'buy': { 'expression': 'price[-1] < sma_s[-1] * ( 1 - dip )', 'params': { 'dip': 0.01 } },
+        'sell': { 'expression': 'price[-1] >= purchase_price * ( 1 + profit )', 'params': { 'profit': 0.005 } }
+    }
+
+    folder = args.folder if args.folder else tempfile.mkdtemp( prefix = 'soak-' )
+    makedirs( folder, exist_ok = True )
+    chdir( folder )
+    print( 'Running ' + str( args.ticks ) + ' iterations in ' + folder )
+
+    b = bot()
+
+    # Simulated time: one iteration every minutes_between_updates
+    interval = timedelta( minutes = config[ 'bot' ][ 'minutes_between_updates' ] )
+    start = datetime( 2021, 1, 1 )
+    clock = { 'now': start }
+    b.clock = lambda: clock[ 'now' ]
+
+    # Simulated prices: a wave around 450,000 (shifted for each coin), with some noise
+    tickers = list( config[ 'ticker_list' ].values() )
+    rng = np.random.default_rng( 0 )
+    def get_price( now, ticker ):
+        return round( 450000 * ( 1 + args.amplitude * np.sin( 2 * np.pi * ( ( now - start ) / interval ) / args.period + tickers.index( ticker ) ) ) + rng.normal( 0, 100 ), 3 )
+    b.get_simulated_price = lambda ticker: get_price( clock[ 'now' ], ticker )
+
+    # Start from a full dataset, so that the bot doesn't download the historical data from Kraken
+    rows = config[ 'bot' ][ 'max_data_rows' ]
+    b.data = pd.DataFrame( { 'timestamp': [ pd.Timestamp( start - ( rows - x ) * interval ) for x in range( rows ) ] } )
+    for a_robinhood_ticker in tickers:
+        b.data[ a_robinhood_ticker ] = [ get_price( x, a_robinhood_ticker ) for x in b.data[ 'timestamp' ] ]
+        b.data = replay( config[ 'ta' ], config[ 'assets' ] ).add_indicators( b.data, a_robinhood_ticker )
+    b.validator.seed( b.data )
+
+    # Closed orders kept in memory, plus the open ones (at most one per coin, since each buy uses all the cash)
+    max_orders = args.max_closed_orders + len( tickers )
+    failures = []
+
+    baseline = None
+    print( "{:<10}  {:<14}  {:<14}  {:<8}  {:<8}  {:<8}".format( 'Iteration', 'Resident (MB)', 'Traced (MB)', 'Orders', 'Paper', 'Rows' ) )
+
+    for tick in range( 1, args.ticks + 1 ):
+        clock[ 'now' ] += interval
+        b.run()
+
+        if tick == args.warmup:
+            gc.collect()
+            baseline = ( b.memory.get_usage(), b.memory.get_traced() )
+
+        if len( b.paper.orders ) > max_orders or len( b.orders ) > max_orders:
+            failures.append( 'iteration ' + str( tick ) + ': ' + str( len( b.orders ) ) + ' orders, ' + str( len( b.paper.orders ) ) + ' paper orders in memory (limit: ' + str( max_orders ) + ')' )
+
+        if tick % args.report_every == 0 or tick == args.ticks:
+            print( "{:<10}  {:<14}  {:<14}  {:<8}  {:<8}  {:<8}".format( tick, round( b.memory.get_usage(), 1 ), round( b.memory.get_traced(), 1 ), len( b.orders ), len( b.paper.orders ), b.data.shape[ 0 ] ) )
+
+    if baseline is None:
+        print( 'Not enough iterations to measure the memory growth (warm-up: ' + str( args.warmup ) + ')' )
+        exit()
+
+    gc.collect()
+    growth = b.memory.get_traced() - baseline[ 1 ]
+    print( 'Memory growth after the warm-up: ' + str( round( growth, 2 ) ) + ' MB traced, ' + str( round( b.memory.get_usage() - baseline[ 0 ], 2 ) ) + ' MB resident' )
+
+    archived = count_archived( 'pickle/paper-archive.pickle' )
+    print( 'Paper orders: ' + str( len( b.paper.orders ) ) + ' in memory, ' + str( archived ) + ' archived' )
+
+    if growth > args.tolerance:
+        failures.append( 'memory grew by more than ' + str( args.tolerance ) + ' MB' )
+
+    if archived == 0:
+        failures.append( 'no closed orders were archived: increase --ticks or decrease --max-closed-orders' )
+
+    if len( failures ) > 0:
+        print( 'FAILED: ' + '\n  '.join( failures[ :10 ] ) )
+        sys.exit( 1 )
+
+    print( 'PASSED' )
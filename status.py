@@ -0,0 +1,111 @@
+#!/usr/bin/python3 -u
+
+# Crypto Trading Bot - Display the most recent iterations recorded in the tick log
+# Version: 1.1
+
+from classes.logger import logger
+from classes.snapshot import snapshot
+import json
+from os import path, stat
+import sys
+from time import sleep
+
+def tail( filename, count ):
+    # Read the file backwards in blocks until we have enough lines, instead of loading it all
+    with open( filename, 'rb' ) as f:
+        f.seek( 0, 2 )
+        position = f.tell()
+        buffer = b''
+
+        while position > 0 and buffer.count( b'\n' ) <= count:
+            step = min( 65536, position )
+            position -= step
+            f.seek( position )
+            buffer = f.read( step ) + buffer
+
+    return [ x for x in buffer.decode( 'utf8' ).splitlines() if x.strip() != '' ][ -count: ]
+
+def show( line ):
+    try:
+        record = json.loads( line )
+    except ValueError:
+        return
+
+    print( '\n'.join( logger.render( record ) ) )
+    print( '' )
+
+def show_live( filename, follow ):
+    # Read the state published by the running bot, instead of the tick log
+    try:
+        reader = snapshot( filename )
+    except FileNotFoundError:
+        print( 'Snapshot not found: ' + filename + ' (is the bot running?)' )
+        exit()
+
+    last_sequence = 0
+    try:
+        while True:
+            latest = reader.read()
+            if latest is not None and latest[ 0 ] != last_sequence:
+                last_sequence = latest[ 0 ]
+                print( '\n'.join( logger.render( latest[ 2 ] ) ) )
+                print( '' )
+            elif latest is None and not follow:
+                print( 'Nothing published yet' )
+
+            if not follow:
+                break
+
+            sleep( 1 )
+    except KeyboardInterrupt:
+        pass
+
+    reader.close()
+    exit()
+
+filename = 'logs/ticks.jsonl'
+count = 1
+follow = False
+live = False
+
+for a_arg in sys.argv[ 1: ]:
+    if a_arg in [ '-f', '--follow' ]:
+        follow = True
+    elif a_arg in [ '-l', '--live' ]:
+        live = True
+    elif a_arg.isdigit():
+        count = int( a_arg )
+    elif path.exists( a_arg ):
+        filename = a_arg
+    else:
+        print( 'Syntax: status.py [count] [-f|--follow] [-l|--live] [tick_log|snapshot]' )
+        exit()
+
+if live:
+    show_live( filename if filename != 'logs/ticks.jsonl' else snapshot.default_filename(), follow )
+
+if not path.exists( filename ):
+    print( 'Tick log not found: ' + filename )
+    exit()
+
+for a_line in tail( filename, count ):
+    show( a_line )
+
+# Wait for new iterations, reopening the file when it gets rotated
+while follow:
+    with open( filename, 'r', encoding = 'utf8' ) as f:
+        f.seek( 0, 2 )
+        inode = stat( filename ).st_ino
+
+        try:
+            while True:
+                a_line = f.readline()
+                if a_line.endswith( '\n' ):
+                    show( a_line )
+                    continue
+
+                sleep( 1 )
+                if not path.exists( filename ) or stat( filename ).st_ino != inode or stat( filename ).st_size < f.tell():
+                    break
+        except KeyboardInterrupt:
+            exit()
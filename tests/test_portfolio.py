@@ -0,0 +1,26 @@
+from datetime import datetime
+import json
+
+from classes.asset import asset
+from classes.portfolio import portfolio
+
+def test_restart_keeps_daily_loss_cap():
+    orders = { '1': asset( 'BTC', 1.0, 100.0, '1', 'B' ) }
+    orders[ '1' ].status = 'B'
+
+    a_portfolio = portfolio( [ 'BTC' ], daily_loss_cap = 10.0 )
+    a_portfolio.rebuild( orders )
+    a_portfolio.update( [ 100.0 ], datetime( 2026, 1, 1, 9 ) )
+    a_portfolio.update( [ 85.0 ], datetime( 2026, 1, 1, 10 ) )
+    assert a_portfolio.is_loss_cap_breached()
+
+    # Same day, after a restart: the P&L at the start of the day and the drawdown are restored
+    restarted = portfolio( [ 'BTC' ], daily_loss_cap = 10.0 )
+    restarted.rebuild( orders, state = json.loads( json.dumps( a_portfolio.get_state() ) ) )
+    restarted.update( [ 85.0 ], datetime( 2026, 1, 1, 11 ) )
+    assert restarted.is_loss_cap_breached()
+    assert restarted.total_max_drawdown == 15.0
+
+    # The next day starts over
+    restarted.update( [ 85.0 ], datetime( 2026, 1, 2, 9 ) )
+    assert not restarted.is_loss_cap_breached()
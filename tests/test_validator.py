@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from classes.validator import validator
+
+def feed( a_validator, ticker, prices, start ):
+    return [ a_validator.check( ticker, a_price, start + timedelta( minutes = 5 * i ) ) for i, a_price in enumerate( prices ) ]
+
+def test_price_jump_unlocks_ticker():
+    a_validator = validator( [ 'BTC' ], max_outliers = 3, max_percent_change = 30.0, stale_minutes = 0 )
+    start = datetime( 2026, 1, 1 )
+
+    assert all( feed( a_validator, 'BTC', [ 100.0 + ( i % 3 ) for i in range( 10 ) ], start ) )
+
+    # A real jump (+50%) is rejected by the hard limit at first, then accepted as a new level
+    results = feed( a_validator, 'BTC', [ 150.0, 151.0, 152.0, 151.0, 150.0 ], start + timedelta( hours = 1 ) )
+    assert results == [ False, False, True, True, True ]
+    assert not a_validator.is_locked( 'BTC' )
+    assert list( a_validator.history[ 'BTC' ] ) == [ 152.0, 151.0, 150.0 ]
+
+def test_single_spike_is_rejected():
+    a_validator = validator( [ 'BTC' ], max_outliers = 3, max_percent_change = 30.0, stale_minutes = 0 )
+    start = datetime( 2026, 1, 1 )
+
+    assert all( feed( a_validator, 'BTC', [ 100.0 + ( i % 3 ) for i in range( 10 ) ], start ) )
+    assert feed( a_validator, 'BTC', [ 500.0, 101.0 ], start + timedelta( hours = 1 ) ) == [ False, True ]
+    assert a_validator.outlier_streak[ 'BTC' ] == 0